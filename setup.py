@@ -11,6 +11,11 @@ setup(
         'PyYAML',
         'yaspin',
     ],
+    extras_require={
+        'fast': ['rapidfuzz'],  # C++ fuzzy matching for component suggestions
+        'http2': ['h2'],  # HTTP/2 for OpenAI requests (multiplexes batch calls)
+        'repl': ['prompt_toolkit'],  # line editing for `shalev interactive`, also on Windows
+    },
     entry_points={
         'console_scripts': [
             'shalev=shalev.cli:main',  # shalev-cli, or whatever you want the command to be called
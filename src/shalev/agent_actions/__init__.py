@@ -1,3 +1,3 @@
 from .agent import *
 
-__all__ = ['agent_action_single_component', 'agent_action_source_and_dest_components', 'agent_action_multi_input_components', 'interactive_session']
\ No newline at end of file
+__all__ = ['agent_action_single_component', 'agent_action_single_component_many', 'agent_action_source_and_dest_components', 'agent_action_multi_input_components', 'agent_action_multi_input_many_targets', 'interactive_session']
\ No newline at end of file
@@ -1,18 +1,125 @@
+import asyncio
+import atexit
+import filecmp
+import functools
+import hashlib
 import os
+import re
+import stat
 import sys
-from openai import OpenAI
-from dataclasses import dataclass, field
+import tempfile
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
 import difflib
 import yaml
 from pprint import pprint
-from yaspin import yaspin
-from typing import List
+from typing import List, Optional, Tuple
 from shalev.shalev_eachrun_setup import ShalevWorkspace  # <-- adjust path if needed
-from shalev.shalev_config import get_openai_api_key
+from shalev.shalev_config import get_openai_api_key, cache_path, read_json_snapshot, write_json_snapshot, YamlLoader
 
 SIZE_LIMIT = 30000
 
 
+# Listed component trees: {components_folder: (((dirpath, mtime_ns), ...), files)}
+_component_files_cache = {}
+
+# Basename lookups built from those listings: {components_folder: (files, by_basename, by_name_no_ext)}
+_basename_index_cache = {}
+
+
+def _dirs_unchanged(dir_mtimes) -> bool:
+    try:
+        return all(os.stat(dirpath).st_mtime_ns == mtime_ns for dirpath, mtime_ns in dir_mtimes)
+    except OSError:
+        return False
+
+
+def _list_component_files(components_folder: str) -> Tuple[str, ...]:
+    """List all files under components_folder as paths relative to it.
+
+    Uses os.scandir so file/dir classification comes from the directory
+    listing itself instead of a stat per entry. Like os.walk, symlinked
+    directories are not descended into, and unreadable or vanished
+    directories are skipped.
+
+    The listing is cached per folder and reused until the mtime of any
+    listed directory changes (i.e. an entry was added, removed or renamed).
+    """
+    cached = _component_files_cache.get(components_folder)
+    if cached is not None and _dirs_unchanged(cached[0]):
+        return cached[1]
+
+    # Entry paths all start with the folder plus a separator; slicing that
+    # off is much cheaper than os.path.relpath per file
+    prefix_len = len(os.path.join(components_folder, ''))
+    dir_mtimes = []
+    all_files = []
+    stack = [components_folder]
+    while stack:
+        dirpath = stack.pop()
+        subdirs = []
+        files = []
+        try:
+            # Stat before listing, so a change made mid-scan invalidates the cache
+            mtime_ns = os.stat(dirpath).st_mtime_ns
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif entry.is_file():
+                        # FIFOs, sockets and devices are never offered as components
+                        files.append(entry.path[prefix_len:])
+        except OSError:
+            # Skipped like os.walk does; a None mtime never matches, so it's retried next call
+            dir_mtimes.append((dirpath, None))
+            continue
+        dir_mtimes.append((dirpath, mtime_ns))
+        all_files.extend(files)
+        # Reversed so directories are visited in listing order
+        stack.extend(reversed(subdirs))
+
+    all_files = tuple(all_files)
+    _component_files_cache[components_folder] = (tuple(dir_mtimes), all_files)
+    return all_files
+
+
+def _component_basename_index(components_folder: str):
+    """Return (all_files, {basename: [paths]}, {basename without extension: [paths]}).
+
+    Rebuilt only when the cached folder listing changes.
+    """
+    all_files = _list_component_files(components_folder)
+    cached = _basename_index_cache.get(components_folder)
+    if cached is not None and cached[0] is all_files:
+        return cached
+
+    by_basename = defaultdict(list)
+    by_name_no_ext = defaultdict(list)
+    for f in all_files:
+        f_basename = os.path.basename(f)
+        by_basename[f_basename].append(f)
+        by_name_no_ext[os.path.splitext(f_basename)[0]].append(f)
+    index = (all_files, dict(by_basename), dict(by_name_no_ext))
+    _basename_index_cache[components_folder] = index
+    return index
+
+
+def _close_matches(word: str, possibilities: List[str], n: int = 3, cutoff: float = 0.6) -> List[str]:
+    """Return up to n possibilities whose similarity ratio to word is >= cutoff, best first.
+
+    Uses rapidfuzz's C++ scorer when it is installed and falls back to
+    difflib.get_close_matches otherwise.
+    """
+    try:
+        from rapidfuzz import fuzz, process
+    except ImportError:
+        return difflib.get_close_matches(word, possibilities, n=n, cutoff=cutoff)
+    matches = process.extract(word, possibilities, scorer=fuzz.ratio, score_cutoff=cutoff * 100, limit=n)
+    return [match for match, _score, _index in matches]
+
+
 def find_similar_components(components_folder: str, component_handle: str, max_suggestions: int = 5) -> List[str]:
     """Find components similar to the given handle when exact match not found.
 
@@ -21,9 +128,6 @@ def find_similar_components(components_folder: str, component_handle: str, max_s
     - Files in subdirectories matching the name
     - Files with similar names (fuzzy match on basename)
     """
-    import glob
-    import difflib
-
     suggestions = []
     basename = os.path.basename(component_handle)
     dirname = os.path.dirname(component_handle)
@@ -35,49 +139,36 @@ def find_similar_components(components_folder: str, component_handle: str, max_s
         if os.path.isfile(candidate_path):
             suggestions.append(candidate)
 
-    # 2. Get all files in the components folder recursively
-    all_files = []
-    for root, dirs, files in os.walk(components_folder):
-        for f in files:
-            full_path = os.path.join(root, f)
-            rel_path = os.path.relpath(full_path, components_folder)
-            all_files.append(rel_path)
+    # Extension hits are what the user meant; no need to walk the tree
+    if suggestions:
+        return suggestions[:max_suggestions]
 
-    # 3. Look for exact basename matches in subdirectories
-    for f in all_files:
-        f_basename = os.path.basename(f)
-        f_name_no_ext = os.path.splitext(f_basename)[0]
-        # Match if basename (with or without extension) matches
-        if f_basename == basename or f_name_no_ext == basename:
-            if f not in suggestions:
-                suggestions.append(f)
+    # 2. Get all files in the components folder recursively, indexed by
+    # basename with and without extension
+    all_files, by_basename, by_name_no_ext = _component_basename_index(components_folder)
+
+    def add(paths):
+        for path in paths:
+            if path not in suggestions:
+                suggestions.append(path)
+
+    # 3. Look for exact basename matches (with or without extension) in subdirectories
+    exact_matches = set(by_basename.get(basename, ())) | set(by_name_no_ext.get(basename, ()))
+    add(f for f in all_files if f in exact_matches)
+
+    # Exact basename hits beat anything the fuzzy matcher could add
+    if suggestions:
+        return suggestions[:max_suggestions]
 
     # 4. Fuzzy match on basename
-    all_basenames = [(os.path.basename(f), f) for f in all_files]
-    close_matches = difflib.get_close_matches(
-        basename,
-        [b for b, _ in all_basenames],
-        n=max_suggestions,
-        cutoff=0.6
-    )
-    for match in close_matches:
-        for b, full in all_basenames:
-            if b == match and full not in suggestions:
-                suggestions.append(full)
+    for match in _close_matches(basename, list(by_basename), n=max_suggestions, cutoff=0.6):
+        add(by_basename[match])
 
-    # Also try matching without extension
+    # Also try matching without extension, unless the list is already full
     basename_no_ext = os.path.splitext(basename)[0]
-    if basename_no_ext != basename:
-        close_matches = difflib.get_close_matches(
-            basename_no_ext,
-            [os.path.splitext(b)[0] for b, _ in all_basenames],
-            n=max_suggestions,
-            cutoff=0.6
-        )
-        for match in close_matches:
-            for b, full in all_basenames:
-                if os.path.splitext(b)[0] == match and full not in suggestions:
-                    suggestions.append(full)
+    if basename_no_ext != basename and len(suggestions) < max_suggestions:
+        for match in _close_matches(basename_no_ext, list(by_name_no_ext), n=max_suggestions, cutoff=0.6):
+            add(by_name_no_ext[match])
 
     return suggestions[:max_suggestions]
 
@@ -92,51 +183,204 @@ def read_component_file(components_folder: str, component_handle: str, exact: bo
         (resolved_component_handle, text) - the handle may differ if a suggestion was used
     """
     component_path = os.path.join(components_folder, component_handle)
+    f = None
+    try:
+        # Only regular files: opening a FIFO or device could block forever
+        if stat.S_ISREG(os.stat(component_path).st_mode):
+            f = open(component_path, 'rb')
+    except (FileNotFoundError, NotADirectoryError):
+        pass
 
-    if not os.path.isfile(component_path):
+    if f is None:
         suggestions = find_similar_components(components_folder, component_handle)
         print(f"Component not found: {component_handle}", file=sys.stderr)
 
         if suggestions and not exact:
-            suggested = suggestions[0]
+            # Use the best suggestion that is within the size limit; if none
+            # is, the best one fails the size check below
+            suggested = None
+            for candidate in suggestions:
+                candidate_size = os.stat(os.path.join(components_folder, candidate)).st_size
+                if suggested is None or candidate_size <= SIZE_LIMIT:
+                    suggested = candidate
+                if candidate_size <= SIZE_LIMIT:
+                    break
             print(f"Using: {suggested}", file=sys.stderr)
-            if len(suggestions) > 1:
-                print(f"  (other options: {', '.join(suggestions[1:])})", file=sys.stderr)
+            other_options = [s for s in suggestions if s != suggested]
+            if other_options:
+                print(f"  (other options: {', '.join(other_options)})", file=sys.stderr)
             component_handle = suggested
             component_path = os.path.join(components_folder, component_handle)
+            f = open(component_path, 'rb')
         elif suggestions:
             print(f"\nDid you mean: {', '.join(suggestions)}?", file=sys.stderr)
             sys.exit(1)
         else:
             sys.exit(1)
 
-    file_size = os.path.getsize(component_path)
-    if file_size > SIZE_LIMIT:
-        print(f"File {component_path} is too large ({file_size} bytes; limit is {SIZE_LIMIT} bytes).", file=sys.stderr)
+    with f:
+        return (component_handle, _read_bounded(f, component_path))
+
+
+def _read_bounded(f, path: str, limit: Optional[int] = SIZE_LIMIT) -> str:
+    """Read the binary file f (opened from path) as UTF-8 text; exits if it is over limit bytes.
+
+    Newlines are translated like a text-mode read. limit=None reads the whole file.
+    """
+    if limit is None:
+        data = f.read()
+    else:
+        # Reading one byte past the limit is enough to tell an oversize file
+        # apart, without a separate stat on the common path
+        data = f.read(limit + 1)
+        if len(data) > limit:
+            file_size = os.fstat(f.fileno()).st_size
+            print(f"File {path} is too large ({file_size} bytes; limit is {limit} bytes).", file=sys.stderr)
+            sys.exit(1)
+
+    text = data.decode('utf-8')
+    if '\r' in text:
+        # Same universal-newline handling as reading in text mode
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+# Shared AsyncOpenAI client and the event loop it belongs to: (loop, client)
+_async_client = None
+
+# Max number of chat completion requests in flight during batch actions
+BATCH_CONCURRENCY = 8
+
+def _openai_api_key():
+    """Return the stored API key, or None to let the SDK read OPENAI_API_KEY.
+
+    Exits if neither is configured.
+    """
+    api_key = get_openai_api_key()
+    if not api_key and not os.environ.get("OPENAI_API_KEY"):
+        print("No OpenAI API key found. Set one with: shalev config --openai-api-key <key>", file=sys.stderr)
         sys.exit(1)
+    return api_key
 
-    with open(component_path, "r", encoding="utf-8") as f:
-        return (component_handle, f.read())
+def _http_client_options(async_client: bool = False) -> dict:
+    """Extra OpenAI client kwargs that turn on HTTP/2 when the optional h2 package is installed.
 
-# Lazy load the OpenAI client
-_client = None
+    The SDK's default httpx client already keeps connections alive and
+    reuses them; HTTP/2 additionally multiplexes concurrent batch requests
+    over a single connection.
+    """
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return {}
+    import openai
+    http_client_class = openai.DefaultAsyncHttpxClient if async_client else openai.DefaultHttpxClient
+    return {'http_client': http_client_class(http2=True)}
+
+def _construct_client():
+    from openai import OpenAI
+    api_key = _openai_api_key()
+    try:
+        client = OpenAI(api_key=api_key, **_http_client_options())
+    except Exception:
+        print(f"Problem with OpenAI client - check API key.", file=sys.stderr)
+        sys.exit(1)
+    atexit.register(client.close)
+    return client
 
+@functools.cache
 def get_client():
-    global _client
-    if _client is None:
-        api_key = get_openai_api_key()
+    """Return the shared OpenAI client, creating it on first use.
+
+    If construction exits, nothing is cached and the next call tries again.
+    """
+    return _construct_client()
+
+def _start_client_warmup():
+    """Start constructing the shared OpenAI client on a background thread.
+
+    This lets the SDK import and client setup overlap reading the components.
+    Returns a future to wait on before using the client, or None when there is
+    nothing to warm up: the client already exists, or no API key is configured
+    and get_client should report that in the foreground.
+    """
+    if get_client.cache_info().currsize or not (get_openai_api_key() or os.environ.get("OPENAI_API_KEY")):
+        return None
+    executor = ThreadPoolExecutor(max_workers=1)
+    warmup = executor.submit(get_client)
+    executor.shutdown(wait=False)
+    return warmup
+
+def get_async_client():
+    """Return the shared AsyncOpenAI client for the running event loop, creating it on first use.
+
+    An async connection pool belongs to the loop it was opened on, so the
+    client is shared by everything running on one loop and replaced when
+    called from a new loop. Callers must not close it themselves; whoever
+    runs the loop calls _close_async_client before it ends.
+    """
+    global _async_client
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client[0] is not loop:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=_openai_api_key(), **_http_client_options(async_client=True))
+        _async_client = (loop, client)
+    return _async_client[1]
+
+async def _close_async_client():
+    global _async_client
+    if _async_client is not None and _async_client[0] is asyncio.get_running_loop():
+        client = _async_client[1]
+        _async_client = None
+        await client.close()
+
+async def _complete_batch(messages_list):
+    """Send one chat completion request per messages entry, BATCH_CONCURRENCY at a time.
+
+    Returns a response or an exception for each entry, in order.
+    """
+    client = get_async_client()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def complete(messages):
+        async with semaphore:
+            return await client.chat.completions.create(model="gpt-4o", messages=messages)
+    return await asyncio.gather(*(complete(m) for m in messages_list), return_exceptions=True)
+
+def _run_LLM_batch(jobs):
+    """Run [(component_path, messages), ...] concurrently and overwrite each component with its response.
+
+    Jobs whose component resolves to the same file as an earlier job are
+    dropped, since concurrent edits of one file would overwrite each other.
+    A failed request doesn't stop the others; exits with an error afterwards
+    if any failed.
+    """
+    from yaspin import yaspin
+    unique_jobs = {}
+    for component_path, messages in jobs:
+        unique_jobs.setdefault(os.path.realpath(component_path), (component_path, messages))
+    dropped = len(jobs) - len(unique_jobs)
+    if dropped:
+        print(f"Skipping {dropped} target(s) that resolve to the same component file as an earlier target.", file=sys.stderr)
+        jobs = list(unique_jobs.values())
+    _openai_api_key()  # exit on a missing key before starting the event loop
+
+    async def run_batch():
         try:
-            if api_key:
-                _client = OpenAI(api_key=api_key)
-            else:
-                if not os.environ.get("OPENAI_API_KEY"):
-                    print("No OpenAI API key found. Set one with: shalev config --openai-api-key <key>", file=sys.stderr)
-                    sys.exit(1)
-                _client = OpenAI()
-        except Exception:
-            print(f"Problem with OpenAI client - check API key.", file=sys.stderr)
-            sys.exit(1)
-    return _client
+            return await _complete_batch([messages for _, messages in jobs])
+        finally:
+            await _close_async_client()
+
+    with yaspin(text=f"Waiting for {len(jobs)} LLM responses..."):
+        responses = asyncio.run(run_batch())
+    failed = False
+    for (component_path, _), response in zip(jobs, responses):
+        if isinstance(response, Exception):
+            print(f"OpenAI API error for {component_path}: {response}")
+            failed = True
+            continue
+        overwrite_component(component_path, response.choices[0].message.content)
+    if failed:
+        sys.exit(1)
 
 @dataclass
 class ActionPrompt:
@@ -144,126 +388,379 @@ class ActionPrompt:
     main_source_label: str
     system_prompt: dict
     user_prompt: dict
+    _sys_msg: dict = field(init=False, default=None, repr=False, compare=False)
     # additional_source_label: field(repr = False) QQQQ
 
+def _parse_action_prompt(filepath: str) -> ActionPrompt:
+    # Bytes go straight to libyaml, which detects the encoding itself
+    with open(filepath, 'rb') as f:
+        data = yaml.load(f, Loader=YamlLoader)
+    return ActionPrompt(**data)
+
+
+# A plain (unquoted, single-token) agent_command_name line
+_COMMAND_NAME_RE = re.compile(rb'^agent_command_name:[ \t]*([\w.-]+)[ \t]*(?:#.*)?\r?$', re.M)
+
+
+class LazyActionPrompt:
+    """An ActionPrompt that parses its YAML file only when a field is first used.
+
+    Only agent_command_name, found with a regex, is known up front; the
+    other fields are read from the file on first access.
+    """
+
+    def __init__(self, filepath: str, agent_command_name: str):
+        self.filepath = filepath
+        self.agent_command_name = agent_command_name
+        self._prompt = None
+        self._sys_msg = None
+
+    def __getattr__(self, name):
+        # Only reached for attributes not set in __init__
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._prompt is None:
+            self._prompt = _parse_action_prompt(self.filepath)
+        return getattr(self._prompt, name)
+
+    def __repr__(self):
+        return f"LazyActionPrompt({self.filepath!r}, {self.agent_command_name!r})"
+
+
+def _load_action_prompt(filepath: str):
+    """Return a LazyActionPrompt for filepath, or a parsed ActionPrompt if its name isn't a plain token."""
+    with open(filepath, 'rb') as f:
+        match = _COMMAND_NAME_RE.search(f.read())
+    if match is None:
+        return _parse_action_prompt(filepath)
+    return LazyActionPrompt(filepath, match.group(1).decode('utf-8'))
+
+
+# Where action prompt YAMLs live: (subfolder, category_name).
+# None subfolder means root folder.
+ACTION_PROMPT_LOCATIONS = [
+    (None, 'uncategorized'),
+    ('global', 'global'),
+    ('project', 'project'),
+    ('component', 'component'),
+]
+
+# Parsed action prompts per folder: {folder_path: (signature, {name: (ActionPrompt, category)})}
+_configs_cache = {}
+
+# Per-file LRU, so editing one prompt doesn't reload the rest of its folder:
+# {filepath: ((mtime_ns, size), ActionPrompt)}
+PROMPT_FILE_CACHE_SIZE = 100
+_prompt_file_cache = OrderedDict()
+
+
+def _action_prompt_files(folder_path: str):
+    """List (filepath, category, stat_result) for every action prompt YAML in folder_path."""
+    prompt_files = []
+    for subfolder, category in ACTION_PROMPT_LOCATIONS:
+        if subfolder:
+            search_path = os.path.join(folder_path, subfolder)
+        else:
+            search_path = folder_path
+
+        try:
+            entries = os.scandir(search_path)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+
+        with entries:
+            for entry in entries:
+                if entry.name.endswith(('.yaml', '.yml')):
+                    # The stat is needed for the cache signature anyway; like
+                    # before, it follows symlinks
+                    st = entry.stat()
+                    # Skip if it's a directory
+                    if stat.S_ISDIR(st.st_mode):
+                        continue
+                    prompt_files.append((entry.path, category, st))
+    return prompt_files
+
+
+def _cached_action_prompt(filepath: str, st: os.stat_result):
+    """Load one action prompt file, reusing the last result while its mtime and size are unchanged."""
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _prompt_file_cache.get(filepath)
+    if cached is not None and cached[0] == signature:
+        _prompt_file_cache.move_to_end(filepath)
+        return cached[1]
+    action_prompt = _load_action_prompt(filepath)
+    _prompt_file_cache[filepath] = (signature, action_prompt)
+    if len(_prompt_file_cache) > PROMPT_FILE_CACHE_SIZE:
+        _prompt_file_cache.popitem(last=False)
+    return action_prompt
+
+
+def _configs_snapshot_path(folder_path: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(folder_path).encode('utf-8')).hexdigest()[:16]
+    return cache_path(f"action_prompts-{digest}.json")
+
+
+def _snapshot_entry(action_prompt, category: str) -> dict:
+    if isinstance(action_prompt, LazyActionPrompt):
+        return {'category': category, 'filepath': action_prompt.filepath}
+    values = {f.name: getattr(action_prompt, f.name) for f in fields(ActionPrompt) if f.init}
+    return {'category': category, 'fields': values}
+
+
+def _read_configs_snapshot(folder_path: str, signature: tuple):
+    """Return the snapshotted configs for folder_path if they match signature, else None."""
+    data = read_json_snapshot(_configs_snapshot_path(folder_path), [list(s) for s in signature])
+    if data is None:
+        return None
+    try:
+        agent_configs = {}
+        for name, entry in data.items():
+            if 'filepath' in entry:
+                action_prompt = LazyActionPrompt(entry['filepath'], name)
+            else:
+                action_prompt = ActionPrompt(**entry['fields'])
+            agent_configs[name] = (action_prompt, entry['category'])
+        return agent_configs
+    except Exception:
+        # Stale-format snapshot: just reload the YAML
+        return None
+
+
+def _write_configs_snapshot(folder_path: str, signature: tuple, agent_configs: dict):
+    data = {name: _snapshot_entry(action_prompt, category)
+            for name, (action_prompt, category) in agent_configs.items()}
+    write_json_snapshot(_configs_snapshot_path(folder_path), [list(s) for s in signature], data)
+
+
 def load_agent_configs_from_folder(folder_path: str, include_category: bool = False):
     """Load agent configs from folder and subdirectories.
 
     Searches the root folder and subdirectories (global/, project/, component/).
     Actions in subdirectories are categorized by their folder name.
 
+    Files are only scanned for their agent_command_name here; the rest of
+    each YAML is parsed when the action prompt is first used (see
+    LazyActionPrompt).
+
+    Configs are cached per folder, in memory and as a JSON snapshot
+    in the user cache folder, and reused as long as no YAML file was added,
+    removed or modified (by path, mtime and size).
+
     Args:
         folder_path: Path to the action_prompts folder
         include_category: If True, returns dict of {name: (ActionPrompt, category)}
                          If False, returns dict of {name: ActionPrompt}
     """
-    agent_configs = {}
-
-    # Define search locations: (subfolder, category_name)
-    # None subfolder means root folder
-    search_locations = [
-        (None, 'uncategorized'),
-        ('global', 'global'),
-        ('project', 'project'),
-        ('component', 'component'),
-    ]
+    prompt_files = _action_prompt_files(folder_path)
+    signature = tuple((filepath, st.st_mtime_ns, st.st_size) for filepath, _, st in prompt_files)
 
-    for subfolder, category in search_locations:
-        if subfolder:
-            search_path = os.path.join(folder_path, subfolder)
-        else:
-            search_path = folder_path
+    cached = _configs_cache.get(folder_path)
+    if cached is not None and cached[0] == signature:
+        agent_configs = cached[1]
+    else:
+        agent_configs = _read_configs_snapshot(folder_path, signature)
+        if agent_configs is None:
+            agent_configs = {}
+            for filepath, category, st in prompt_files:
+                action_prompt = _cached_action_prompt(filepath, st)
+                agent_configs[action_prompt.agent_command_name] = (action_prompt, category)
+            _write_configs_snapshot(folder_path, signature, agent_configs)
+        _configs_cache[folder_path] = (signature, agent_configs)
 
-        if not os.path.isdir(search_path):
-            continue
+    if include_category:
+        return dict(agent_configs)
+    return {name: action_prompt for name, (action_prompt, _) in agent_configs.items()}
 
-        for filename in os.listdir(search_path):
-            if filename.endswith('.yaml') or filename.endswith('.yml'):
-                filepath = os.path.join(search_path, filename)
-                # Skip if it's a directory
-                if os.path.isdir(filepath):
-                    continue
-                with open(filepath, 'r') as f:
-                    data = yaml.safe_load(f)
-                action_prompt = ActionPrompt(**data)
-                if include_category:
-                    agent_configs[action_prompt.agent_command_name] = (action_prompt, category)
-                else:
-                    agent_configs[action_prompt.agent_command_name] = action_prompt
 
-    return agent_configs
+def refresh_agent_configs():
+    """Forget cached action prompts, so the next load re-reads every YAML file.
 
+    Only needed when a prompt file may have changed without its mtime or size
+    changing; otherwise the caches notice edits by themselves.
+    """
+    for folder_path in _configs_cache:
+        try:
+            os.remove(_configs_snapshot_path(folder_path))
+        except OSError:
+            pass
+    _configs_cache.clear()
+    _prompt_file_cache.clear()
 
-def agent_action_single_component(workspace_data: ShalevWorkspace, action_handle, project_handle, component_handle, exact=False):
-    agent_configs = load_agent_configs_from_folder(workspace_data.action_prompts_folder) #QQQQ do someplace else
-    try:
-        action_prompt = agent_configs[action_handle]
-    except KeyError:
+
+def _resolve_action(workspace_data: ShalevWorkspace, action_handle: str):
+    """Return the action prompt named action_handle, or exit if there is none."""
+    agent_configs = load_agent_configs_from_folder(workspace_data.action_prompts_folder)
+    action_prompt = agent_configs.get(action_handle)
+    if action_prompt is None:
         print(f"No agent action {action_handle}.", file=sys.stderr)
         sys.exit(1)
+    return action_prompt
+
+
+def agent_action_single_component(workspace_data: ShalevWorkspace, action_handle, project_handle, component_handle, exact=False):
+    action_prompt = _resolve_action(workspace_data, action_handle)
+    client_warmup = _start_client_warmup()
     components_folder = workspace_data.projects[project_handle].components_folder
     component_handle, component_text = read_component_file(components_folder, component_handle, exact=exact)
     component_path = os.path.join(components_folder, component_handle)
     messages = make_LLM_messages_single_component(action_prompt, component_text)
-    client = get_client()
-    try:
-        with yaspin(text="Waiting for LLM response...") as spinner:
-            response = client.chat.completions.create(model="gpt-4o",messages=messages)
-    except Exception as e:
-        print(f"OpenAI API error: {e}")
-        sys.exit(1)
-    revised_component_text = response.choices[0].message.content
-    overwrite_component(component_path, revised_component_text)
+    if client_warmup is not None:
+        client_warmup.result()
+    stream_LLM_to_component(messages, component_path)
     # compare_strings_succinct(component_text, revised_component_text)
     # logger.info("start_job", job_id=689, status="running") #QQQQ still doesn't work
 
+def agent_action_single_component_many(workspace_data: ShalevWorkspace, action_handle, project_handle, component_handles: List[str], exact=False):
+    """Run a single-component agent action on several components of a project, with the LLM calls made concurrently.
+
+    Every component is read and size-checked before any request is sent,
+    then each one is overwritten with its own response.
+    """
+    action_prompt = _resolve_action(workspace_data, action_handle)
+    components_folder = workspace_data.projects[project_handle].components_folder
+    jobs = []
+    for component_handle in component_handles:
+        component_handle, component_text = read_component_file(components_folder, component_handle, exact=exact)
+        messages = make_LLM_messages_single_component(action_prompt, component_text)
+        jobs.append((os.path.join(components_folder, component_handle), messages))
+    _run_LLM_batch(jobs)
+
 def agent_action_source_and_dest_components(workspace_data: ShalevWorkspace,
                                             action_handle,
                                             source_project_handle, source_component_handle,
                                             dest_project_handle, dest_component_handle,
                                             exact=False):
-    agent_configs = load_agent_configs_from_folder(workspace_data.action_prompts_folder)
-    try:
-        action_prompt = agent_configs[action_handle]
-    except KeyError:
-        print(f"No agent action {action_handle}.", file=sys.stderr)
-        sys.exit(1)
+    action_prompt = _resolve_action(workspace_data, action_handle)
+    client_warmup = _start_client_warmup()
     source_components_folder = workspace_data.projects[source_project_handle].components_folder
     dest_components_folder = workspace_data.projects[dest_project_handle].components_folder
 
-    source_component_handle, source_component_text = read_component_file(source_components_folder, source_component_handle, exact=exact)
-    dest_component_handle, dest_component_text = read_component_file(dest_components_folder, dest_component_handle, exact=exact)
+    # The two reads are independent, so overlap them
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        source_read = executor.submit(read_component_file, source_components_folder, source_component_handle, exact=exact)
+        dest_read = executor.submit(read_component_file, dest_components_folder, dest_component_handle, exact=exact)
+        source_component_handle, source_component_text = source_read.result()
+        dest_component_handle, dest_component_text = dest_read.result()
     dest_component_path = os.path.join(dest_components_folder, dest_component_handle)
 
     messages = make_LLM_messages_source_and_dest_components(action_prompt, source_component_text, dest_component_text)
+    if client_warmup is not None:
+        client_warmup.result()
+    stream_LLM_to_component(messages, dest_component_path)
+
+def stream_LLM_to_component(messages, component_path):
+    """Stream the LLM response to messages straight into component_path.
+
+    Chunks are written to a temporary file next to the component as they
+    arrive, and it replaces the component only once the response is complete,
+    so a failed request leaves the original untouched. The file is written in
+    text mode, so line endings match what a plain open(path, 'w') would give.
+    """
     client = get_client()
+    import openai
+    from yaspin import yaspin
+    old_size = _existing_size(component_path)
+    fd, tmp_path = _sibling_temp_file(component_path)
+    received = 0
     try:
-        with yaspin(text="Waiting for LLM response...") as spinner:
-            response = client.chat.completions.create(model="gpt-4o",messages=messages)
-    except Exception as e:
-        print(f"OpenAI API error: {e}")
-        sys.exit(1)
-    revised_dest_component_text = response.choices[0].message.content
-    overwrite_component(dest_component_path, revised_dest_component_text)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f, yaspin(text="Waiting for LLM response...") as spinner:
+            stream = client.chat.completions.create(model="gpt-4o", messages=messages, stream=True)
+            for chunk in stream:
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    f.write(content)
+                    received += _utf8_size(content)
+                    spinner.text = f"Receiving LLM response... {received} bytes"
+    except BaseException as e:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        # Connection errors are OSErrors too, so they are told apart from write errors first
+        if isinstance(e, (openai.OpenAIError, ConnectionError, TimeoutError)):
+            print(f"OpenAI API error: {e}")
+            sys.exit(1)
+        if isinstance(e, OSError):
+            print(f"Could not write {component_path}: {e}", file=sys.stderr)
+            sys.exit(1)
+        raise
+    # The size on disk, which differs from received where newlines are translated
+    new_size = os.stat(tmp_path).st_size
+    if new_size == old_size and old_size and filecmp.cmp(tmp_path, component_path, shallow=False):
+        os.remove(tmp_path)
+        _report_unchanged(component_path)
+        return
+    _replace_keeping_mode(tmp_path, component_path)
+    _report_overwrite(component_path, old_size, new_size)
+
+def _sibling_temp_file(path):
+    """Create a temporary file in the same folder as path (where path really lives,
+    if it is a symlink), so it can be renamed over it atomically. Returns (fd, tmp_path).
+    """
+    folder = os.path.dirname(os.path.realpath(path))
+    return tempfile.mkstemp(dir=folder, prefix='.shalev.', suffix='.tmp')
+
+def _replace_keeping_mode(tmp_path, path):
+    """Atomically replace path (or its symlink target) with tmp_path, keeping path's permissions."""
+    path = os.path.realpath(path)
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        # New file: the mode open() would have given it, not mkstemp's 0600
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+def _existing_size(path):
+    """Size of the file at path, or 0 if there is none (one stat)."""
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return 0
 
 def overwrite_component(component_path, revised_component_text):
-    if os.path.isfile(component_path):
-        old_size = os.path.getsize(component_path)
-    else:
-        old_size = 0
-    new_size = len(revised_component_text.encode('utf-8'))
-    with open(component_path, 'w', encoding='utf-8') as f:
-        f.write(revised_component_text)
+    old_size = _existing_size(component_path)
+    data = revised_component_text.encode('utf-8')
+    new_size = len(data)
+    if new_size == old_size and old_size:
+        with open(component_path, 'rb') as f:
+            if f.read() == data:
+                _report_unchanged(component_path)
+                return
+    # Write a sibling file and rename it over the component, so a crash
+    # mid-write never leaves a truncated component behind
+    fd, tmp_path = _sibling_temp_file(component_path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        _replace_keeping_mode(tmp_path, component_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _report_overwrite(component_path, old_size, new_size)
+
+def _report_unchanged(component_path):
+    print(f"LLM response is identical to {component_path}; file left untouched.")
+
+def _report_overwrite(component_path, old_size, new_size):
     print(f"Wrote new content to {component_path}.")
     print(f"Previous file size: {old_size} bytes")
     print(f"New file size: {new_size} bytes ({'increased' if new_size > old_size else 'decreased' if new_size < old_size else 'unchanged'})")
 
+def _system_message(action_prompt):
+    """Return the system message for action_prompt, built once and reused."""
+    if action_prompt._sys_msg is None:
+        action_prompt._sys_msg = {"role": "system", "content": action_prompt.system_prompt["content"]}
+    return action_prompt._sys_msg
+
 def make_LLM_messages_single_component(action_prompt, component_text):
     messages=[
-                {
-                "role": "system",
-                "content": action_prompt.system_prompt["content"],
-                },
+                _system_message(action_prompt),
                 {
                 "role": "user",
                 "content": component_text
@@ -273,10 +770,7 @@ def make_LLM_messages_single_component(action_prompt, component_text):
 
 def make_LLM_messages_source_and_dest_components(action_prompt, source_component_text, dest_component_text):
     messages=[
-                {
-                "role": "system",
-                "content": action_prompt.system_prompt["content"],
-                },
+                _system_message(action_prompt),
                 {
                 "role": "user",
                 "content": "**INPUT**\n"+source_component_text+"\n\n**TARGET**\n"+dest_component_text
@@ -304,10 +798,7 @@ def make_LLM_messages_multi_input_components(action_prompt, input_texts: List[st
     user_content_parts.append(f"**TARGET**\n{target_text}")
 
     messages = [
-        {
-            "role": "system",
-            "content": action_prompt.system_prompt["content"],
-        },
+        _system_message(action_prompt),
         {
             "role": "user",
             "content": "\n\n".join(user_content_parts)
@@ -316,6 +807,52 @@ def make_LLM_messages_multi_input_components(action_prompt, input_texts: List[st
     return messages
 
 
+def read_input_components(workspace_data: ShalevWorkspace, input_projects_components: List[tuple], exact: bool = False):
+    """Read the read-only input components of a multi-input action.
+
+    Inputs with identical content are sent only once (first occurrence wins).
+
+    Returns the input texts, in the order given.
+    """
+    requested = len(input_projects_components)
+    input_projects_components = list(dict.fromkeys(input_projects_components))
+
+    def read_input(project_component):
+        project, component = project_component
+        components_folder = workspace_data.projects[project].components_folder
+        return read_component_file(components_folder, component, exact=exact)[1]
+
+    if len(input_projects_components) > 1:
+        # Reads release the GIL, so the files are read concurrently
+        with ThreadPoolExecutor(max_workers=min(8, len(input_projects_components))) as executor:
+            input_texts = list(executor.map(read_input, input_projects_components))
+    else:
+        input_texts = [read_input(pc) for pc in input_projects_components]
+    unique_texts = list(dict.fromkeys(input_texts))
+    # Counted against the inputs as given, so a component listed twice is reported too
+    dropped = requested - len(unique_texts)
+    if dropped:
+        print(f"Skipping {dropped} input component(s) with content identical to an earlier input.", file=sys.stderr)
+    return unique_texts
+
+
+def _utf8_size(text: str) -> int:
+    # isascii() is a constant-time flag check, and ASCII is one byte per character
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+def check_multi_input_size(texts: List[str]):
+    """Exit if the total UTF-8 size of a multi-input message (inputs + target) is too large."""
+    total_limit = SIZE_LIMIT * 3  # Allow larger total for multi-input
+    # A character is at most 4 bytes in UTF-8, so short messages need no byte count
+    if sum(map(len, texts)) * 4 <= total_limit:
+        return
+    total_size = sum(map(_utf8_size, texts))
+    if total_size > total_limit:
+        print(f"Total message size ({total_size} bytes) exceeds limit ({total_limit} bytes).", file=sys.stderr)
+        sys.exit(1)
+
+
 def agent_action_multi_input_components(
     workspace_data: ShalevWorkspace,
     action_handle: str,
@@ -329,45 +866,67 @@ def agent_action_multi_input_components(
     Input components are read-only examples. The target component is transformed
     based on the style/content of the inputs and overwritten in place.
     """
-    agent_configs = load_agent_configs_from_folder(workspace_data.action_prompts_folder)
-    try:
-        action_prompt = agent_configs[action_handle]
-    except KeyError:
-        print(f"No agent action {action_handle}.", file=sys.stderr)
-        sys.exit(1)
+    action_prompt = _resolve_action(workspace_data, action_handle)
+    client_warmup = _start_client_warmup()
 
-    # Read all input components
-    input_texts = []
-    total_size = 0
-    for project, component in input_projects_components:
-        components_folder = workspace_data.projects[project].components_folder
-        _, text = read_component_file(components_folder, component, exact=exact)
-        input_texts.append(text)
-        total_size += len(text.encode('utf-8'))
+    input_texts = read_input_components(workspace_data, input_projects_components, exact=exact)
 
     # Read target component
     target_components_folder = workspace_data.projects[target_project].components_folder
     target_component, target_text = read_component_file(target_components_folder, target_component, exact=exact)
     target_component_path = os.path.join(target_components_folder, target_component)
-    total_size += len(target_text.encode('utf-8'))
-
-    # Check total message size (inputs + target)
-    total_limit = SIZE_LIMIT * 3  # Allow larger total for multi-input
-    if total_size > total_limit:
-        print(f"Total message size ({total_size} bytes) exceeds limit ({total_limit} bytes).", file=sys.stderr)
-        sys.exit(1)
+    check_multi_input_size(input_texts + [target_text])
 
     messages = make_LLM_messages_multi_input_components(action_prompt, input_texts, target_text)
-    client = get_client()
-    try:
-        with yaspin(text="Waiting for LLM response...") as spinner:
-            response = client.chat.completions.create(model="gpt-4o", messages=messages)
-    except Exception as e:
-        print(f"OpenAI API error: {e}")
-        sys.exit(1)
+    if client_warmup is not None:
+        client_warmup.result()
+    stream_LLM_to_component(messages, target_component_path)
+
+
+def agent_action_multi_input_many_targets(
+    workspace_data: ShalevWorkspace,
+    action_handle: str,
+    input_projects_components: List[tuple],  # [(project, component), ...]
+    target_projects_components: List[tuple],  # [(project, component), ...]
+    exact: bool = False
+):
+    """Run a multi-input agent action on several targets, with the LLM calls made concurrently.
+
+    Inputs are read once and shared by all targets. Every target is read and
+    size-checked before any request is sent, then each target is overwritten
+    with its own response.
+    """
+    action_prompt = _resolve_action(workspace_data, action_handle)
+
+    input_texts = read_input_components(workspace_data, input_projects_components, exact=exact)
+
+    jobs = []
+    for target_project, target_component in target_projects_components:
+        target_components_folder = workspace_data.projects[target_project].components_folder
+        target_component, target_text = read_component_file(target_components_folder, target_component, exact=exact)
+        check_multi_input_size(input_texts + [target_text])
+        messages = make_LLM_messages_multi_input_components(action_prompt, input_texts, target_text)
+        jobs.append((os.path.join(target_components_folder, target_component), messages))
 
-    revised_target_text = response.choices[0].message.content
-    overwrite_component(target_component_path, revised_target_text)
+    _run_LLM_batch(jobs)
+
+
+# A whole-line !!!>include(name) directive (surrounding blanks allowed, as with line.strip())
+_INCLUDE_LINE_RE = re.compile(rb'^[ \t\f\v]*!!!>include\((.*)\)[ \t\r\f\v]*$', re.M)
+
+
+def _includes_basename(path, basename):
+    """Return True if the file at path has an !!!>include of a file named basename."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return False
+    for match in _INCLUDE_LINE_RE.finditer(data):
+        included = match.group(1).decode('utf-8', errors='replace').strip()
+        if os.path.basename(included) == basename:
+            return True
+    return False
 
 
 def find_compose_target(project, component_handle):
@@ -382,28 +941,20 @@ def find_compose_target(project, component_handle):
         return None
 
     basename = os.path.basename(component_handle)
+    scanned = set()
 
-    # Build reverse map: component filename -> target name
+    # Target files themselves, in compose_targets order
     for target_name, target_component in project.compose_targets.items():
-        target_basename = os.path.basename(target_component)
         target_path = os.path.join(project.components_folder, target_component)
-        if not os.path.isfile(target_path):
-            continue
-        # Check if this target file directly references our component
-        if target_basename == basename:
+        # Check if this target file is our component
+        if os.path.basename(target_component) == basename and os.path.isfile(target_path):
+            return target_name
+        scanned.add(os.path.normpath(target_path))
+        if _includes_basename(target_path, basename):
             return target_name
-        try:
-            with open(target_path, 'r') as f:
-                for line in f:
-                    stripped = line.strip()
-                    if stripped.startswith('!!!>include(') and stripped.endswith(')'):
-                        included = stripped[len('!!!>include('):-1].strip()
-                        if os.path.basename(included) == basename:
-                            return target_name
-        except (FileNotFoundError, IOError):
-            continue
 
-    # Also scan all chapter files for the include
+    # Also look for the target files under chapters/; other chapter files
+    # can't map to a target, so they aren't read
     chapters_dir = os.path.join(project.components_folder, 'chapters')
     if os.path.isdir(chapters_dir):
         # Build reverse map: chapter filename -> target name
@@ -411,25 +962,58 @@ def find_compose_target(project, component_handle):
         for target_name, target_component in project.compose_targets.items():
             target_by_chapter[os.path.basename(target_component)] = target_name
 
-        for chapter_file in os.listdir(chapters_dir):
-            chapter_path = os.path.join(chapters_dir, chapter_file)
-            if not os.path.isfile(chapter_path):
-                continue
-            try:
-                with open(chapter_path, 'r') as f:
-                    for line in f:
-                        stripped = line.strip()
-                        if stripped.startswith('!!!>include(') and stripped.endswith(')'):
-                            included = stripped[len('!!!>include('):-1].strip()
-                            if os.path.basename(included) == basename:
-                                if chapter_file in target_by_chapter:
-                                    return target_by_chapter[chapter_file]
-            except (FileNotFoundError, IOError):
-                continue
+        for chapter_file, target_name in target_by_chapter.items():
+            chapter_path = os.path.normpath(os.path.join(chapters_dir, chapter_file))
+            if chapter_path not in scanned and _includes_basename(chapter_path, basename):
+                return target_name
 
     return None
 
 
+def _prompt_toolkit_reader():
+    """Return an interactive input reader backed by prompt_toolkit, or None if it isn't installed.
+
+    Behaves like the termios reader in interactive_session: ';' on an empty
+    line switches to the shell> prompt and backspace on an empty shell line
+    switches back. Returns ('text', line) or ('shell', line).
+    """
+    try:
+        from prompt_toolkit import PromptSession
+        from prompt_toolkit.filters import Condition
+        from prompt_toolkit.key_binding import KeyBindings
+    except ImportError:
+        return None
+
+    state = {'shell': False}
+    in_shell = Condition(lambda: state['shell'])
+    empty_line = Condition(lambda: not session.default_buffer.text)
+    bindings = KeyBindings()
+
+    @bindings.add(';', filter=~in_shell & empty_line)
+    def _enter_shell(event):
+        state['shell'] = True
+
+    @bindings.add('backspace', filter=in_shell & empty_line)
+    def _leave_shell(event):
+        state['shell'] = False
+
+    # One session for the whole REPL, so history carries across turns
+    session = PromptSession(key_bindings=bindings)
+
+    def read():
+        state['shell'] = False
+        try:
+            line = session.prompt(lambda: "shell> " if state['shell'] else "interactive> ")
+        except (EOFError, KeyboardInterrupt):
+            # As in the termios reader, Ctrl-C/Ctrl-D only leave shell mode
+            if state['shell']:
+                return ('shell', '')
+            raise
+        return ('shell' if state['shell'] else 'text', line.strip())
+
+    return read
+
+
 def interactive_session(workspace_data, project_handle, component_handle):
     """Run an interactive editing session on a single component.
 
@@ -437,6 +1021,7 @@ def interactive_session(workspace_data, project_handle, component_handle):
     the component, preview compiled PDFs, view diffs, undo changes, etc.
     """
     import subprocess
+    import threading
     from datetime import datetime
 
     proj = workspace_data.projects[project_handle]
@@ -446,8 +1031,14 @@ def interactive_session(workspace_data, project_handle, component_handle):
     # Auto-detect compose target
     compose_target = find_compose_target(proj, component_handle)
 
-    # Prompt log directory
+    # Prompt log directory, created on the first instruction
     log_dir = os.path.join(workspace_data.action_prompts_folder, 'interactive')
+    log_dir_ready = False
+    comp_basename = os.path.splitext(os.path.basename(component_handle))[0]
+
+    def _write_log(log_path, text):
+        with open(log_path, 'w', encoding='utf-8') as f:
+            f.write(text)
 
     # System prompt for interactive editing
     interactive_system_prompt = (
@@ -467,71 +1058,66 @@ def interactive_session(workspace_data, project_handle, component_handle):
     def _read_interactive_input():
         """Read input with Julia-style instant ; switching to shell mode.
 
+        Fallback for when prompt_toolkit isn't installed (POSIX terminals only).
+
         Returns ('text', line) for normal input, ('shell', line) for shell,
         or raises EOFError/KeyboardInterrupt.
         """
         import tty, termios, readline
 
         prompt = "interactive> "
-        sys.stdout.write(prompt)
-        sys.stdout.flush()
-
+        shell_prompt = "shell> "
         fd = sys.stdin.fileno()
         old_settings = termios.tcgetattr(fd)
+        # Stay in cbreak mode for the whole key-by-key part; readline below
+        # needs the normal terminal settings back
         try:
             tty.setcbreak(fd)
-            ch = sys.stdin.read(1)
-        finally:
-            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
-
-        if ch == '\x03':  # Ctrl-C
-            sys.stdout.write('\n')
-            raise KeyboardInterrupt
-        if ch == '\x04':  # Ctrl-D
-            sys.stdout.write('\n')
-            raise EOFError
-
-        if ch == ';':
-            # Instantly switch to shell prompt, with Julia-style
-            # backspace-on-empty to return to interactive mode
-            shell_prompt = "shell> "
-            sys.stdout.write('\r\033[K' + shell_prompt)
-            sys.stdout.flush()
-            buf = []
             while True:
-                old2 = termios.tcgetattr(fd)
-                try:
-                    tty.setcbreak(fd)
-                    sch = sys.stdin.read(1)
-                finally:
-                    termios.tcsetattr(fd, termios.TCSADRAIN, old2)
+                sys.stdout.write(prompt)
+                sys.stdout.flush()
+                ch = sys.stdin.read(1)
 
-                if sch == '\x03':  # Ctrl-C
+                if ch == '\x03':  # Ctrl-C
                     sys.stdout.write('\n')
-                    return ('shell', '')
-                if sch == '\x04':  # Ctrl-D
+                    raise KeyboardInterrupt
+                if ch == '\x04':  # Ctrl-D
                     sys.stdout.write('\n')
-                    return ('shell', '')
-                if sch == '\x7f' or sch == '\x08':  # Backspace
-                    if not buf:
-                        # Empty buffer — backspace exits shell, back to interactive
-                        sys.stdout.write('\r\033[K')
-                        sys.stdout.flush()
-                        return _read_interactive_input()
-                    buf.pop()
-                    sys.stdout.write('\r\033[K' + shell_prompt + ''.join(buf))
-                    sys.stdout.flush()
-                    continue
-                if sch in ('\r', '\n'):
+                    raise EOFError
+                if ch in ('\r', '\n'):
                     sys.stdout.write('\n')
-                    return ('shell', ''.join(buf).strip())
-                buf.append(sch)
-                sys.stdout.write(sch)
-                sys.stdout.flush()
+                    return ('text', '')
+                if ch != ';':
+                    break
 
-        if ch in ('\r', '\n'):
-            sys.stdout.write('\n')
-            return ('text', '')
+                # Instantly switch to shell prompt, with Julia-style
+                # backspace-on-empty to return to interactive mode
+                sys.stdout.write('\r\033[K' + shell_prompt)
+                sys.stdout.flush()
+                buf = []
+                while True:
+                    sch = sys.stdin.read(1)
+                    if sch in ('\x03', '\x04'):  # Ctrl-C / Ctrl-D
+                        sys.stdout.write('\n')
+                        return ('shell', '')
+                    if sch == '\x7f' or sch == '\x08':  # Backspace
+                        if not buf:
+                            # Empty buffer — backspace exits shell, back to interactive
+                            sys.stdout.write('\r\033[K')
+                            sys.stdout.flush()
+                            break
+                        buf.pop()
+                        sys.stdout.write('\r\033[K' + shell_prompt + ''.join(buf))
+                        sys.stdout.flush()
+                        continue
+                    if sch in ('\r', '\n'):
+                        sys.stdout.write('\n')
+                        return ('shell', ''.join(buf).strip())
+                    buf.append(sch)
+                    sys.stdout.write(sch)
+                    sys.stdout.flush()
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
 
         # Normal text — pre-fill readline with the first character
         sys.stdout.write('\r\033[K')
@@ -542,9 +1128,14 @@ def interactive_session(workspace_data, project_handle, component_handle):
             readline.set_startup_hook(None)
         return ('text', line.strip())
 
+    read_input = _prompt_toolkit_reader() or _read_interactive_input
+    # Component text as of the last turn, with the (mtime_ns, size) it was read at
+    component_text = None
+    component_signature = None
+
     while True:
         try:
-            mode, user_input = _read_interactive_input()
+            mode, user_input = read_input()
         except (EOFError, KeyboardInterrupt):
             print("\nExiting interactive session.")
             break
@@ -582,26 +1173,29 @@ def interactive_session(workspace_data, project_handle, component_handle):
                 print("No compose target detected. Use: /preview <target_name>")
                 continue
             print(f"Composing target '{target}'...")
-            from shalev.compose_actions import compose_target_action
+            from shalev.compose_actions import compose_target_action, open_pdf
             success, pdf_filename = compose_target_action(proj, target)
             if success and pdf_filename:
-                pdf_path = os.path.join(proj.build_folder, pdf_filename)
-                subprocess.run(['open', pdf_path])
+                open_pdf(os.path.join(proj.build_folder, pdf_filename))
             continue
 
         # Otherwise: LLM instruction
-        # Read current component text from disk
-        with open(component_path, 'r', encoding='utf-8') as f:
-            component_text = f.read()
-
-        # Log the instruction
-        os.makedirs(log_dir, exist_ok=True)
+        # Reuse the text from the last turn unless the file changed on disk
+        st = os.stat(component_path)
+        if (st.st_mtime_ns, st.st_size) != component_signature:
+            with open(component_path, 'rb') as f:
+                component_text = _read_bounded(f, component_path, limit=None)
+            component_signature = (st.st_mtime_ns, st.st_size)
+
+        # Log the instruction, in the background while the LLM works
+        if not log_dir_ready:
+            os.makedirs(log_dir, exist_ok=True)
+            log_dir_ready = True
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        comp_basename = os.path.splitext(os.path.basename(component_handle))[0]
         log_filename = f"{timestamp}_{comp_basename}.txt"
         log_path = os.path.join(log_dir, log_filename)
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.write(user_input)
+        log_writer = threading.Thread(target=_write_log, args=(log_path, user_input))
+        log_writer.start()
 
         # Build messages
         messages = [
@@ -610,19 +1204,48 @@ def interactive_session(workspace_data, project_handle, component_handle):
         ]
 
         client = get_client()
+        from yaspin import yaspin
         try:
             with yaspin(text="Waiting for LLM response...") as spinner:
                 response = client.chat.completions.create(model="gpt-4o", messages=messages)
         except Exception as e:
             print(f"OpenAI API error: {e}")
             continue
+        finally:
+            log_writer.join()
 
         revised_text = response.choices[0].message.content
         overwrite_component(component_path, revised_text)
+        if '\r' not in revised_text:  # else reload, to get text-mode newlines
+            st = os.stat(component_path)
+            component_text = revised_text
+            component_signature = (st.st_mtime_ns, st.st_size)
 
 
 def compare_strings_succinct(original, corrected):
-    diff = difflib.unified_diff(original.split(), corrected.split(), lineterm='')
-    # Join and print the differences
-    print('\n'.join(diff))
-
+    """Print the line-level edits that turn original into corrected, one -line/+line per change."""
+    original_lines = original.splitlines()
+    corrected_lines = corrected.splitlines()
+    lines = []
+    try:
+        from rapidfuzz.distance import Levenshtein
+    except ImportError:
+        # Same shape as the editops below: a replaced block pairs up its lines
+        matcher = difflib.SequenceMatcher(None, original_lines, corrected_lines)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                continue
+            for k in range(max(i2 - i1, j2 - j1)):
+                if i1 + k < i2:
+                    lines.append('-' + original_lines[i1 + k])
+                if j1 + k < j2:
+                    lines.append('+' + corrected_lines[j1 + k])
+        print('\n'.join(lines))
+        return
+
+    for op in Levenshtein.editops(original_lines, corrected_lines):
+        if op.tag != 'insert':
+            lines.append('-' + original_lines[op.src_pos])
+        if op.tag != 'delete':
+            lines.append('+' + corrected_lines[op.dest_pos])
+    print('\n'.join(lines))
@@ -1,6 +1,7 @@
 import click
 import logging
 import os
+import re
 import shutil
 import sys
 import subprocess
@@ -31,17 +32,24 @@ class VariadicOption(click.Option):
 # logging setup #
 #################
 
+_logging_configured = False
+
+
 def setup_logging():
+    """Reset the root logger once; later calls leave its handlers alone."""
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
     logger.handlers.clear()
 
 
-from shalev.agent_actions import *
-from shalev.compose_actions import *
-from shalev.split_actions import split_component
-from shalev.shalev_eachrun_setup import *
-from shalev.shalev_config import get_aliases, save_alias, get_default_project, save_default_project, config as config_func, init_actions
+# The action subpackages are imported inside the commands that use them,
+# so that --help, alias, config and friends don't pay for loading them
+from shalev.shalev_eachrun_setup import setup_workspace, missing_gitignore_entries, find_git_root
+from shalev.shalev_config import get_aliases, save_alias, get_default_project, save_default_project, config as config_func, init_actions, YamlDumper
 
 # workspace_data is lazily loaded by commands that need it
 # action_prompt_templates = setup_action_prompt_templates(workspace_data["action_prompts_path"])
@@ -55,13 +63,25 @@ def cli():
     pass
 
 
+_verbose_handler = None
+
+
 def enable_verbose_logging():
-    """Add a stream handler to show log messages on stdout."""
+    """Add a stream handler to show log messages on stdout.
+
+    Calling it again reuses the same handler, so messages are never shown twice.
+    """
+    global _verbose_handler
     logger = logging.getLogger()
-    stream = logging.StreamHandler(sys.stdout)
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", "%H:%M:%S")
-    stream.setFormatter(formatter)
-    logger.addHandler(stream)
+    if _verbose_handler is None:
+        _verbose_handler = logging.StreamHandler(sys.stdout)
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", "%H:%M:%S")
+        _verbose_handler.setFormatter(formatter)
+    else:
+        # sys.stdout may have been replaced since (e.g. by click's CliRunner)
+        _verbose_handler.setStream(sys.stdout)
+    if _verbose_handler not in logger.handlers:
+        logger.addHandler(_verbose_handler)
 
 
 def resolve_project(workspace_data, project):
@@ -117,6 +137,7 @@ def compose(project_or_target, show_log, show_shalev_log):
     """
     if show_shalev_log:
         enable_verbose_logging()
+    from shalev.compose_actions import compose_action, compose_target_action
     workspace_data = setup_workspace()
 
     # Smart resolution: project name, compose target, or full compose
@@ -172,6 +193,13 @@ def agent(action, projcomps, all_ext, inputs, targets, list_actions, exact, show
     """
     if show_shalev_log:
         enable_verbose_logging()
+    from shalev.agent_actions import (
+        agent_action_single_component,
+        agent_action_single_component_many,
+        agent_action_source_and_dest_components,
+        agent_action_multi_input_components,
+        agent_action_multi_input_many_targets,
+    )
     workspace_data = setup_workspace()
 
     if list_actions:
@@ -222,50 +250,47 @@ def agent(action, projcomps, all_ext, inputs, targets, list_actions, exact, show
 
     # Resolve aliases helper
     aliases = get_aliases()
+    default_proj = None  # resolved on the first bare component, then reused
+    alias_notes = []  # "Using alias" lines not yet echoed
+
+    def echo_alias_notes():
+        if alias_notes:
+            click.echo("\n".join(alias_notes))
+            alias_notes.clear()
 
     def resolve_component(pc):
-        """Resolve aliases and bare components to full project~component format."""
+        """Resolve aliases and bare components to a (project, component) tuple."""
+        nonlocal default_proj
         # Resolve alias
         if pc in aliases:
             resolved = aliases[pc]
-            click.echo(f"Using alias '{pc}' -> '{resolved}'")
+            alias_notes.append(f"Using alias '{pc}' -> '{resolved}'")
             pc = resolved
 
+        project, sep, component = pc.partition('~')
         # Resolve bare component (no ~) using default project
-        if '~' not in pc:
-            default_proj = resolve_project(workspace_data, None)
-            return f"{default_proj}~{pc}"
-        else:
-            if pc.count('~') != 1:
-                raise click.UsageError(f"'{pc}' has too many '~'. Format should be project~component")
-            return pc
+        if not sep:
+            if default_proj is None:
+                # Keep the alias lines ahead of any message from resolve_project
+                echo_alias_notes()
+                default_proj = resolve_project(workspace_data, None)
+            return (default_proj, pc)
+        if '~' in component:
+            raise click.UsageError(f"'{pc}' has too many '~'. Format should be project~component")
+        if project not in workspace_data.projects:
+            raise click.UsageError(f"Project '{project}' not found")
+        return (project, component)
 
     if flag_mode:
-        # Resolve inputs and targets
-        resolved_inputs = [resolve_component(inp) for inp in inputs]
-        resolved_targets = [resolve_component(tgt) for tgt in targets]
-
-        # Parse into (project, component) tuples
-        input_projcomps = []
-        for inp in resolved_inputs:
-            project, component = inp.split('~', 1)
-            if project not in workspace_data.projects:
-                raise click.UsageError(f"Project '{project}' not found")
-            input_projcomps.append((project, component))
-
-        target_projcomps = []
-        for tgt in resolved_targets:
-            project, component = tgt.split('~', 1)
-            if project not in workspace_data.projects:
-                raise click.UsageError(f"Project '{project}' not found")
-            target_projcomps.append((project, component))
+        # Resolve inputs and targets into (project, component) tuples
+        input_projcomps = [resolve_component(inp) for inp in inputs]
+        target_projcomps = [resolve_component(tgt) for tgt in targets]
+        echo_alias_notes()
 
         logging.info(f"Agent action '{action}' with {len(input_projcomps)} input(s) on {len(target_projcomps)} target(s)")
 
-        # Process each target
-        for i, (target_project, target_component) in enumerate(target_projcomps, 1):
-            if len(target_projcomps) > 1:
-                click.echo(f"[{i}/{len(target_projcomps)}] Processing target: {target_project}~{target_component}")
+        if len(target_projcomps) == 1:
+            target_project, target_component = target_projcomps[0]
             agent_action_multi_input_components(
                 workspace_data,
                 action,
@@ -274,18 +299,23 @@ def agent(action, projcomps, all_ext, inputs, targets, list_actions, exact, show
                 target_component,
                 exact=exact
             )
-            if len(target_projcomps) > 1:
-                click.echo()
+            return
 
-        if len(target_projcomps) > 1:
-            click.echo(f"Completed processing {len(target_projcomps)} target(s).")
+        # Several targets: send the LLM requests concurrently
+        click.echo(f"Processing {len(target_projcomps)} targets: " + ', '.join(f"{p}~{c}" for p, c in target_projcomps))
+        agent_action_multi_input_many_targets(
+            workspace_data,
+            action,
+            input_projcomps,
+            target_projcomps,
+            exact=exact
+        )
+        click.echo(f"Completed processing {len(target_projcomps)} target(s).")
         return
 
     # Standard positional mode
-    resolved_projcomps = []
-    for pc in projcomps:
-        resolved_projcomps.append(resolve_component(pc))
-    projcomps = tuple(resolved_projcomps)
+    projcomps = [resolve_component(pc) for pc in projcomps]
+    echo_alias_notes()
 
     logging.info(f"Agent action '{action}' on: {projcomps}")
 
@@ -294,18 +324,17 @@ def agent(action, projcomps, all_ext, inputs, targets, list_actions, exact, show
         if len(projcomps) != 1:
             raise click.UsageError("--all mode requires exactly one project~folder argument")
 
-        project, folder = projcomps[0].split('~', 1)
-        if project not in workspace_data.projects:
-            raise click.UsageError(f"Project '{project}' not found")
-
+        project, folder = projcomps[0]
         folder_path = os.path.join(workspace_data.projects[project].components_folder, folder)
         if not os.path.isdir(folder_path):
             raise click.UsageError(f"Folder not found: {folder_path}")
 
         # Find all files with the given extension
         ext = all_ext if all_ext.startswith('.') else '.' + all_ext
-        matching_files = [f for f in os.listdir(folder_path)
-                         if f.endswith(ext) and os.path.isfile(os.path.join(folder_path, f))]
+        # scandir entries carry the file type, so there's no stat per file
+        with os.scandir(folder_path) as entries:
+            matching_files = sorted(entry.name for entry in entries
+                                    if entry.name.endswith(ext) and entry.is_file())
 
         if not matching_files:
             click.echo(f"No files with extension '{ext}' found in {folder_path}")
@@ -316,11 +345,13 @@ def agent(action, projcomps, all_ext, inputs, targets, list_actions, exact, show
             click.echo(f"  - {f}")
         click.echo()
 
-        for i, filename in enumerate(matching_files, 1):
-            component = os.path.join(folder, filename)
-            click.echo(f"[{i}/{len(matching_files)}] Processing: {component}")
-            agent_action_single_component(workspace_data, action, project, component, exact=exact)
-            click.echo()
+        components = [os.path.join(folder, filename) for filename in matching_files]
+        if len(components) == 1:
+            agent_action_single_component(workspace_data, action, project, components[0], exact=exact)
+        else:
+            # Send the LLM requests concurrently
+            agent_action_single_component_many(workspace_data, action, project, components, exact=exact)
+        click.echo()
 
         click.echo(f"Completed processing {len(matching_files)} file(s).")
         return
@@ -328,11 +359,10 @@ def agent(action, projcomps, all_ext, inputs, targets, list_actions, exact, show
     if len(projcomps) == 0:
         raise click.UsageError(f"Need at least one project~component pair")
     elif len(projcomps) == 1:
-        project, component = projcomps[0].split('~', 1)
+        project, component = projcomps[0]
         agent_action_single_component(workspace_data, action, project, component, exact=exact)
     elif len(projcomps) == 2:
-        source_project, source_component = projcomps[0].split('~', 1)
-        dest_project, dest_component = projcomps[1].split('~', 1)
+        (source_project, source_component), (dest_project, dest_component) = projcomps
         agent_action_source_and_dest_components(workspace_data, action, source_project, source_component, dest_project, dest_component, exact=exact)
 
         # print(f"{source_project=}, {source_component=}, {dest_project=}, {dest_component=}")
@@ -376,24 +406,28 @@ def status(show_shalev_log):
     workspace_data = setup_workspace()
     logging.info("Displaying status")
 
-    click.echo(f"Workspace: {workspace_data.name}")
+    # Built up and echoed in one write
+    lines = [f"Workspace: {workspace_data.name}"]
     if workspace_data.description:
-        click.echo(f"  {workspace_data.description.strip()}")
-    click.echo(f"Action prompts: {workspace_data.action_prompts_folder}")
+        lines.append(f"  {workspace_data.description.strip()}")
+    lines.append(f"Action prompts: {workspace_data.action_prompts_folder}")
     if workspace_data.workspace_system_prompts:
-        click.echo(f"System prompts: {workspace_data.workspace_system_prompts}")
-    click.echo("")
-    click.echo(f"Projects ({len(workspace_data.projects)}):")
+        lines.append(f"System prompts: {workspace_data.workspace_system_prompts}")
+    lines.append("")
+    lines.append(f"Projects ({len(workspace_data.projects)}):")
     for handle, proj in workspace_data.projects.items():
-        click.echo(f"  [{handle}] {proj.name}")
+        lines.append(f"  [{handle}] {proj.name}")
         if proj.description:
-            click.echo(f"    {proj.description.strip()}")
-        click.echo(f"    project_folder:        {proj.project_folder}")
-        click.echo(f"    components_folder:      {proj.components_folder}")
-        click.echo(f"    root_component:         {proj.root_component}")
-        click.echo(f"    supporting_files_folder: {proj.supporting_files_folder}")
-        click.echo(f"    results_folder:         {proj.results_folder}")
-        click.echo(f"    build_folder:           {proj.build_folder}")
+            lines.append(f"    {proj.description.strip()}")
+        lines.extend([
+            f"    project_folder:        {proj.project_folder}",
+            f"    components_folder:      {proj.components_folder}",
+            f"    root_component:         {proj.root_component}",
+            f"    supporting_files_folder: {proj.supporting_files_folder}",
+            f"    results_folder:         {proj.results_folder}",
+            f"    build_folder:           {proj.build_folder}",
+        ])
+    click.echo("\n".join(lines))
 
 ################
 # shalev alias #
@@ -494,6 +528,7 @@ def view(project_or_target, show_shalev_log):
     """
     if show_shalev_log:
         enable_verbose_logging()
+    from shalev.compose_actions import open_pdf
     workspace_data = setup_workspace()
 
     # Smart resolution: if arg is not a project name, treat as compose target
@@ -506,7 +541,7 @@ def view(project_or_target, show_shalev_log):
             if not os.path.exists(pdf_path):
                 print(f"Error: {pdf_path} does not exist. Run 'shalev compose {target_name}' first.")
                 sys.exit(1)
-            subprocess.run(['open', pdf_path])
+            open_pdf(pdf_path)
             return
         else:
             available = ', '.join(sorted(proj.compose_targets.keys())) if proj.compose_targets else 'none'
@@ -518,32 +553,66 @@ def view(project_or_target, show_shalev_log):
     if not os.path.exists(pdf_path):
         print(f"Error: {pdf_path} does not exist. Run 'shalev compose {project}' first.")
         sys.exit(1)
-    subprocess.run(['open', pdf_path])
+    open_pdf(pdf_path)
 
 ###############
 # shalev tree #
 ###############
-def build_tree(file_path, components_folder, processed_files=None, file_index=None):
-    """Parse include statements and return list of (name, subtree) tuples."""
-    if processed_files is None:
-        processed_files = set()
-    if file_path in processed_files:
-        return []
-    processed_files.add(file_path)
+# An include line, as tree reads them: the reference runs to the last ')' on the line
+_TREE_INCLUDE_RE = re.compile(rb'^!!!>include\((.*)\)[ \t\r\f\v]*$', re.M)
+
 
-    children = []
+def _include_refs(file_path):
+    """Return the include references in file_path, in order ([] if it doesn't exist)."""
     try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                if line.startswith('!!!>include(') and line.rstrip().endswith(')'):
-                    included = line[len('!!!>include('):line.rstrip().rindex(')')].strip()
-                    included_path = resolve_include(included, components_folder, file_index)
-                    subtree = build_tree(included_path, components_folder, processed_files, file_index)
-                    children.append((included, subtree))
+        with open(file_path, 'rb') as f:
+            data = f.read()
     except FileNotFoundError:
-        pass
-    processed_files.discard(file_path)
-    return children
+        return []
+    return [ref.decode('utf-8').strip() for ref in _TREE_INCLUDE_RE.findall(data)]
+
+
+def build_tree(file_path, components_folder, processed_files=None, file_index=None):
+    """Parse include statements and return list of (name, subtree) tuples.
+
+    processed_files holds the files already being expanded; including one of
+    them again (a cycle) gives an empty subtree.
+    """
+    from shalev.compose_actions import resolve_include
+    ancestors = set(processed_files) if processed_files else set()
+    if file_path in ancestors:
+        return []
+
+    # A file included from several places is read once
+    refs_by_path = {}
+
+    def refs_of(path):
+        if path not in refs_by_path:
+            refs_by_path[path] = _include_refs(path)
+        return iter(refs_by_path[path])
+
+    root_children = []
+    ancestors.add(file_path)
+    # Depth-first, with an explicit stack of (path, remaining refs, children list)
+    stack = [(file_path, refs_of(file_path), root_children)]
+    while stack:
+        path, refs, children = stack[-1]
+        included = next(refs, None)
+        if included is not None:
+            try:
+                included_path = resolve_include(included, components_folder, file_index)
+            except FileNotFoundError:
+                included = None  # an unresolvable include ends its file's children
+        if included is None:
+            stack.pop()
+            ancestors.discard(path)
+            continue
+        subtree = []
+        children.append((included, subtree))
+        if included_path not in ancestors:
+            ancestors.add(included_path)
+            stack.append((included_path, refs_of(included_path), subtree))
+    return root_children
 
 
 def print_tree(name, children, prefix="", is_last=True):
@@ -572,6 +641,7 @@ def tree(project, show_shalev_log):
     """
     if show_shalev_log:
         enable_verbose_logging()
+    from shalev.compose_actions import build_file_index
     workspace_data = setup_workspace()
     project = resolve_project(workspace_data, project)
     proj = workspace_data.projects[project]
@@ -639,43 +709,40 @@ def setup(projects, directory):
         }
     }
 
+    # Paths created, reported together once everything is in place
+    created = []
+
     os.makedirs(directory, exist_ok=True)
     with open(config_path, 'w') as f:
-        yaml.dump(config_data, f, default_flow_style=False, sort_keys=False)
-    click.echo(f"Created {config_path}")
+        yaml.dump(config_data, f, Dumper=YamlDumper, default_flow_style=False, sort_keys=False)
+    created.append(config_path)
 
     # Create action_prompts folder
     action_prompts_dir = os.path.join(directory, 'action_prompts')
     os.makedirs(action_prompts_dir, exist_ok=True)
-    click.echo(f"Created {action_prompts_dir}")
+    created.append(action_prompts_dir)
 
     # Create project directories and root.tex
     build_folders = []
     for entry in project_entries:
-        handle = entry['project_handle']
         project_dir = os.path.join(directory, entry['project_folder'])
-        for subfolder in ['components', 'supporting_files', 'results', 'build']:
+        for subfolder in ('components', 'supporting_files', 'results', 'build'):
             path = os.path.join(project_dir, subfolder)
             os.makedirs(path, exist_ok=True)
-            click.echo(f"Created {path}")
-        # Create empty root.tex
+            created.append(path)
+        # Create empty root.tex, keeping an existing one ('x' fails if it exists)
         root_tex = os.path.join(project_dir, 'components', 'root.tex')
-        if not os.path.exists(root_tex):
-            open(root_tex, 'w').close()
-            click.echo(f"Created {root_tex}")
+        try:
+            open(root_tex, 'x').close()
+            created.append(root_tex)
+        except FileExistsError:
+            pass
         build_folders.append(f"{entry['project_folder']}/build")
+    click.echo("\n".join(f"Created {path}" for path in created))
 
     # Check .gitignore for build folders
     gitignore_path = os.path.join(directory, '.gitignore')
-    missing_entries = []
-    if os.path.exists(gitignore_path):
-        with open(gitignore_path, 'r') as f:
-            gitignore_content = f.read()
-        for bf in build_folders:
-            if bf not in gitignore_content:
-                missing_entries.append(bf)
-    else:
-        missing_entries = build_folders
+    missing_entries = missing_gitignore_entries(gitignore_path, build_folders)
 
     if missing_entries:
         click.echo("")
@@ -684,8 +751,7 @@ def setup(projects, directory):
             click.echo(f"  {bf}")
         if click.confirm("Add them to .gitignore?"):
             with open(gitignore_path, 'a') as f:
-                for bf in missing_entries:
-                    f.write(bf + "\n")
+                f.write("".join(bf + "\n" for bf in missing_entries))
             click.echo("Updated .gitignore.")
 
     click.echo("")
@@ -697,12 +763,14 @@ def setup(projects, directory):
 ################
 @click.command()
 @click.argument('project', required=False, default=None)
+@click.option('--verbose', '-v', is_flag=True, help="List the files before deleting them")
 @click.option('--show-shalev-log', is_flag=True, help="Show shalev internal log messages")
-def flush(project, show_shalev_log):
+def flush(project, verbose, show_shalev_log):
     """Delete all files in the build folder for a project.
 
-    Lists files before deleting and prompts for confirmation. Warns if
-    any files in the build folder are tracked by git.
+    Shows how many files will be deleted (or lists them with --verbose)
+    and prompts for confirmation. Warns if any files in the build folder
+    are tracked by git.
 
     PROJECT is optional; auto-selects when there is a single project or
     uses the default project.
@@ -713,38 +781,52 @@ def flush(project, show_shalev_log):
     project = resolve_project(workspace_data, project)
     build_folder = workspace_data.projects[project].build_folder
 
-    if not os.path.isdir(build_folder) or not os.listdir(build_folder):
+    try:
+        with os.scandir(build_folder) as it:
+            entries = list(it)
+    except (FileNotFoundError, NotADirectoryError):
+        entries = []
+    if not entries:
         click.echo("Build folder is already empty.")
         return
 
-    # List files that will be deleted
-    click.echo(f"Files in {build_folder}:")
-    for entry in sorted(os.listdir(build_folder)):
-        click.echo(f"  {entry}")
-
-    # Check for git-tracked files
-    try:
-        result = subprocess.run(
-            ['git', 'ls-files', build_folder],
-            capture_output=True, text=True
-        )
-        tracked = result.stdout.strip()
-        if tracked:
-            click.echo("")
-            click.echo("Warning: Some files in the build folder are tracked by git:")
-            for f in tracked.splitlines():
-                click.echo(f"  {f}")
-            click.echo(f"\nTo untrack them, run:\n  git rm -r --cached {build_folder}")
-            click.echo("")
-    except FileNotFoundError:
-        pass  # git not available
+    # Summarize (or list) the files that will be deleted
+    if verbose:
+        click.echo(f"Files in {build_folder}:")
+        click.echo("\n".join(f"  {name}" for name in sorted(entry.name for entry in entries)))
+    else:
+        click.echo(f"{len(entries)} file(s) in {build_folder} (use --verbose to list them).")
+
+    # Check for git-tracked files (no need to run git outside a repository)
+    git_root = find_git_root(build_folder)
+    if git_root is not None:
+        try:
+            result = subprocess.run(
+                ['git', '-C', git_root, 'ls-files', '--', os.path.abspath(build_folder)],
+                capture_output=True, text=True
+            )
+            tracked = result.stdout.strip()
+            if tracked:
+                click.echo("")
+                click.echo("Warning: Some files in the build folder are tracked by git:")
+                for f in tracked.splitlines():
+                    click.echo(f"  {f}")
+                click.echo(f"\nTo untrack them, run:\n  git rm -r --cached {build_folder}")
+                click.echo("")
+        except FileNotFoundError:
+            pass  # git not available
 
     if not click.confirm(f"Delete all files in {build_folder}?"):
         click.echo("Aborted.")
         return
 
-    shutil.rmtree(build_folder)
-    os.makedirs(build_folder)
+    # Build folders are mostly flat, so unlink the listed entries in place
+    # rather than walking and recreating the whole folder
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path)
+        else:
+            os.unlink(entry.path)
     click.echo(f"Build folder flushed: {build_folder}")
 
 
@@ -775,6 +857,7 @@ def split(component, split_type, target, numbered, show_shalev_log):
     """
     if show_shalev_log:
         enable_verbose_logging()
+    from shalev.split_actions import split_component
     workspace_data = setup_workspace()
 
     # Resolve aliases
@@ -834,6 +917,7 @@ def interactive(component, show_shalev_log):
     """
     if show_shalev_log:
         enable_verbose_logging()
+    from shalev.agent_actions import interactive_session
     workspace_data = setup_workspace()
 
     # Resolve aliases
@@ -1,3 +1,3 @@
-from .compose import compose_action, compose_target_action, build_file_index, resolve_include
+from .compose import compose_action, compose_target_action, build_file_index, resolve_include, open_pdf
 
-__all__ = ['compose_action', 'compose_target_action', 'build_file_index', 'resolve_include']
\ No newline at end of file
+__all__ = ['compose_action', 'compose_target_action', 'build_file_index', 'resolve_include', 'open_pdf']
\ No newline at end of file
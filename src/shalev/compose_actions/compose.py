@@ -1,6 +1,7 @@
 import subprocess
 import os
 import re
+import sys
 from ..shalev_eachrun_setup import *
 
 
@@ -293,3 +294,20 @@ def compose_target_action(shalev_project, target_name, show_log=False):
     except Exception as e:
         print(f"Error: {e}")
         return (False, None)
+
+
+def open_pdf(pdf_path):
+    """Open pdf_path in the system's default PDF viewer without waiting for it.
+
+    Uses 'open' on macOS, the shell association on Windows and 'xdg-open'
+    elsewhere; the viewer is started in its own session so it outlives shalev.
+    """
+    if sys.platform == 'win32':
+        os.startfile(pdf_path)
+        return
+    opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
+    try:
+        subprocess.Popen([opener, pdf_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+    except FileNotFoundError:
+        print(f"Could not find '{opener}' to open {pdf_path}.", file=sys.stderr)
@@ -1,9 +1,18 @@
+import json
 import os
 import sys
+import types
 import yaml
 
+# LibYAML's C loader and dumper, when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
+
 CONFIG_FILE = ".shalev.yaml"
 SECRETS_FILE = os.path.expanduser("~/.shalev.secrets.yaml")
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "shalev")
 
 # Default action prompts to install with --init-actions
 DEFAULT_ACTIONS = {
@@ -59,12 +68,52 @@ DEFAULT_ACTIONS = {
 }
 
 
+def cache_path(filename):
+    """Return the path of filename inside the per-user shalev cache folder."""
+    return os.path.join(CACHE_DIR, filename)
+
+
+def read_json_snapshot(snapshot_path, signature):
+    """Return the data snapshotted at snapshot_path if it was saved with signature, else None.
+
+    signature must be built from JSON types (lists, not tuples) to compare equal.
+    """
+    try:
+        with open(snapshot_path, 'rb') as f:
+            snapshot = json.load(f)
+        if snapshot['sig'] != signature:
+            return None
+        return snapshot['data']
+    except Exception:
+        # Missing, stale-format or corrupt snapshot: the caller parses the source
+        return None
+
+
+def write_json_snapshot(snapshot_path, signature, data):
+    """Atomically save data with signature to snapshot_path, if JSON keeps it intact.
+
+    Failures are ignored, since a snapshot is only an optimization.
+    """
+    tmp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+    try:
+        text = json.dumps({'sig': signature, 'data': data})
+        # YAML can hold things JSON can't round-trip (dates, non-string keys)
+        if json.loads(text)['data'] != data:
+            return
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, snapshot_path)
+    except (OSError, TypeError, ValueError):
+        pass
+
+
 def get_openai_api_key():
     """Read openai_api_key from the secrets file, returns None if missing."""
     if not os.path.exists(SECRETS_FILE):
         return None
     with open(SECRETS_FILE, 'r') as f:
-        data = yaml.safe_load(f) or {}
+        data = yaml.load(f, Loader=YamlLoader) or {}
     return data.get('openai_api_key', None)
 
 
@@ -72,7 +121,7 @@ def save_openai_api_key(key):
     """Write or update the OpenAI API key in the secrets file."""
     if os.path.exists(SECRETS_FILE):
         with open(SECRETS_FILE, 'r') as f:
-            data = yaml.safe_load(f) or {}
+            data = yaml.load(f, Loader=YamlLoader) or {}
     else:
         data = {}
 
@@ -80,16 +129,51 @@ def save_openai_api_key(key):
 
     with open(SECRETS_FILE, 'w') as f:
         f.write("# Shalev secrets — do NOT commit or share this file.\n")
-        yaml.dump(data, f, default_flow_style=False)
+        yaml.dump(data, f, Dumper=YamlDumper, default_flow_style=False)
+
+
+# Parsed .shalev.yaml per absolute path: {path: ((mtime_ns, size), config_data)}
+_config_cache = {}
+
+
+def read_config(fn=CONFIG_FILE):
+    """Return the parsed .shalev.yaml (or fn), or None if it doesn't exist.
+
+    The parse is reused while the file's mtime and size are unchanged;
+    callers must not modify the returned dict.
+    """
+    path = os.path.abspath(fn)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _config_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with open(path, 'r') as f:
+        config_data = yaml.load(f, Loader=YamlLoader) or {}
+    _config_cache[path] = (signature, config_data)
+    return config_data
+
+
+def _write_config(config_data):
+    """Write config_data to .shalev.yaml and drop its cached parse."""
+    with open(CONFIG_FILE, 'w') as f:
+        yaml.dump(config_data, f, Dumper=YamlDumper, default_flow_style=False)
+    # A rewrite within the mtime granularity could keep the same signature
+    _config_cache.pop(os.path.abspath(CONFIG_FILE), None)
 
 
 def get_aliases():
-    """Read aliases from .shalev.yaml, returns empty dict if none exist."""
-    if not os.path.exists(CONFIG_FILE):
-        return {}
-    with open(CONFIG_FILE, 'r') as f:
-        config_data = yaml.safe_load(f) or {}
-    return config_data.get('aliases', {})
+    """Read aliases from .shalev.yaml, returns an empty mapping if none exist.
+
+    The mapping is read-only, since it is shared with later calls.
+    """
+    config_data = read_config()
+    if config_data is None:
+        return types.MappingProxyType({})
+    return types.MappingProxyType(config_data.get('aliases') or {})
 
 
 def save_alias(short_name, full_component):
@@ -99,23 +183,21 @@ def save_alias(short_name, full_component):
         sys.exit(1)
 
     with open(CONFIG_FILE, 'r') as f:
-        config_data = yaml.safe_load(f) or {}
+        config_data = yaml.load(f, Loader=YamlLoader) or {}
 
     if 'aliases' not in config_data:
         config_data['aliases'] = {}
 
     config_data['aliases'][short_name] = full_component
 
-    with open(CONFIG_FILE, 'w') as f:
-        yaml.dump(config_data, f, default_flow_style=False)
+    _write_config(config_data)
 
 
 def get_default_project():
     """Read default project from .shalev.yaml, returns None if not set."""
-    if not os.path.exists(CONFIG_FILE):
+    config_data = read_config()
+    if config_data is None:
         return None
-    with open(CONFIG_FILE, 'r') as f:
-        config_data = yaml.safe_load(f) or {}
     return config_data.get('default_project', None)
 
 
@@ -126,12 +208,11 @@ def save_default_project(project_handle):
         sys.exit(1)
 
     with open(CONFIG_FILE, 'r') as f:
-        config_data = yaml.safe_load(f) or {}
+        config_data = yaml.load(f, Loader=YamlLoader) or {}
 
     config_data['default_project'] = project_handle
 
-    with open(CONFIG_FILE, 'w') as f:
-        yaml.dump(config_data, f, default_flow_style=False)
+    _write_config(config_data)
 
 
 def init_actions():
@@ -141,7 +222,7 @@ def init_actions():
         sys.exit(1)
 
     with open(CONFIG_FILE, 'r') as f:
-        config_data = yaml.safe_load(f) or {}
+        config_data = yaml.load(f, Loader=YamlLoader) or {}
 
     workspace_folder = config_data.get('workspace_folder')
     if not workspace_folder:
@@ -155,7 +236,7 @@ def init_actions():
         sys.exit(1)
 
     with open(workspace_config_path, 'r') as f:
-        ws_config = yaml.safe_load(f)
+        ws_config = yaml.load(f, Loader=YamlLoader)
 
     action_prompts_rel = ws_config.get('workspace', {}).get('action_prompts_folder', './action_prompts')
     action_prompts_folder = os.path.join(workspace_folder, action_prompts_rel)
@@ -184,7 +265,7 @@ def init_actions():
                 skipped_actions.append(f"{category}/{filename}")
             else:
                 with open(filepath, 'w') as f:
-                    yaml.dump(action_data, f, default_flow_style=False, sort_keys=False)
+                    yaml.dump(action_data, f, Dumper=YamlDumper, default_flow_style=False, sort_keys=False)
                 created_actions.append(f"{category}/{filename}")
 
     if created_actions:
@@ -209,9 +290,9 @@ def config(workspace_folder=None, openai_api_key=None):
         # Display current config
         if os.path.exists(CONFIG_FILE):
             with open(CONFIG_FILE, 'r') as f:
-                config_data = yaml.safe_load(f)
+                config_data = yaml.load(f, Loader=YamlLoader)
                 print(f"Current configuration in {CONFIG_FILE}:")
-                print(yaml.dump(config_data, default_flow_style=False))
+                print(yaml.dump(config_data, Dumper=YamlDumper, default_flow_style=False))
         else:
             print(f"No {CONFIG_FILE} found.")
             print(f"Usage: shalev config -w <workspace_folder>")
@@ -239,8 +320,7 @@ def config(workspace_folder=None, openai_api_key=None):
         # Create or update config file
         config_data = {"workspace_folder": workspace_folder}
 
-        with open(CONFIG_FILE, 'w') as f:
-            yaml.dump(config_data, f, default_flow_style=False)
+        _write_config(config_data)
 
         print(f"Created {CONFIG_FILE}")
         print(f"  workspace_folder: {workspace_folder}")
\ No newline at end of file
@@ -1,10 +1,11 @@
+import hashlib
 import os
-import subprocess
 import sys
 import yaml
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional
 from pprint import pprint
+from shalev.shalev_config import YamlLoader, cache_path, read_config, read_json_snapshot, write_json_snapshot
 
 @dataclass
 class ShalevProject:
@@ -68,28 +69,44 @@ def check_workspace_data_valid(workspace_data: ShalevWorkspace) -> List[str]:
         ])
     return [path for path in folders_to_check if not os.path.isdir(path)]
 
+def missing_gitignore_entries(gitignore_path: str, entries: List[str]) -> List[str]:
+    """Return the entries that aren't already lines of the .gitignore at gitignore_path.
+
+    Lines are compared whole, ignoring a leading or trailing '/', so
+    'proj/build' is covered by '/proj/build/' but not by 'proj/build_old'.
+    """
+    listed = set()
+    try:
+        with open(gitignore_path, 'r') as f:
+            listed = {line.strip().strip('/') for line in f}
+    except FileNotFoundError:
+        pass
+    return [entry for entry in entries if entry.strip('/') not in listed]
+
+def find_git_root(path: str) -> Optional[str]:
+    """Return the nearest folder at or above path containing .git, or None.
+
+    .git is a folder in a normal checkout and a file in worktrees and submodules.
+    """
+    path = os.path.abspath(path)
+    while True:
+        if os.path.exists(os.path.join(path, '.git')):
+            return path
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
 def check_workspace_health(workspace_data: ShalevWorkspace, workspace_folder: str):
     """Run health checks: git repo presence and .gitignore coverage of build folders."""
-    # 1. Check if workspace is inside a git repo
-    result = subprocess.run(
-        ['git', '-C', workspace_folder, 'rev-parse', '--git-dir'],
-        capture_output=True, text=True
-    )
-    if result.returncode != 0:
+    # 1. Check if workspace is inside a git repo (a stat walk, not a git process per run)
+    if find_git_root(workspace_folder) is None:
         print("Warning: Workspace folder is not inside a git repository. Consider running 'git init'.")
 
     # 2. Check .gitignore for build folders
     gitignore_path = os.path.join(workspace_folder, '.gitignore')
-    gitignore_content = ""
-    if os.path.exists(gitignore_path):
-        with open(gitignore_path, 'r') as f:
-            gitignore_content = f.read()
-
-    missing_entries = []
-    for proj in workspace_data.projects.values():
-        rel_build = os.path.relpath(proj.build_folder, workspace_folder)
-        if rel_build not in gitignore_content:
-            missing_entries.append(rel_build)
+    build_folders = [os.path.relpath(proj.build_folder, workspace_folder) for proj in workspace_data.projects.values()]
+    missing_entries = missing_gitignore_entries(gitignore_path, build_folders)
 
     if missing_entries:
         print("Warning: The following build folders are not in .gitignore:")
@@ -98,47 +115,75 @@ def check_workspace_health(workspace_data: ShalevWorkspace, workspace_folder: st
         answer = input("Add them to .gitignore? [y/n]: ").strip().lower()
         if answer == "y":
             with open(gitignore_path, 'a') as f:
-                for entry in missing_entries:
-                    f.write(entry + "\n")
+                f.write("".join(entry + "\n" for entry in missing_entries))
             print("Updated .gitignore.")
 
 
+# Parsed workspace_config.yaml per absolute path: {path: ([mtime_ns, size], workspace_dict)}
+_workspace_config_cache = {}
+
+def _workspace_config_snapshot_path(path: str) -> str:
+    digest = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]
+    return cache_path(f"workspace_config-{digest}.json")
+
+def load_workspace_config(path: str):
+    """Parse the workspace_config.yaml at path.
+
+    Parses are cached in memory and as a JSON snapshot in the user cache
+    folder, and reused while the file's mtime and size are unchanged;
+    callers must not modify the returned dict. Raises FileNotFoundError
+    and yaml.YAMLError like a plain load.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    signature = [st.st_mtime_ns, st.st_size]
+    cached = _workspace_config_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    snapshot_path = _workspace_config_snapshot_path(path)
+    workspace_dict = read_json_snapshot(snapshot_path, signature)
+    if workspace_dict is None:
+        with open(path) as config_file:
+            workspace_dict = yaml.load(config_file, Loader=YamlLoader)
+        write_json_snapshot(snapshot_path, signature, workspace_dict)
+    _workspace_config_cache[path] = (signature, workspace_dict)
+    return workspace_dict
+
+
 def setup_workspace(fn = ".shalev.yaml"):
-    try:
-        with open(fn) as dot_shalev_file:
-            dot_shalev_dict = yaml.safe_load(dot_shalev_file)
-            if "workspace_folder" in dot_shalev_dict:
-                workspace_folder = dot_shalev_dict["workspace_folder"]
-            else:
-                print(f"workspace_folder is not properly set in {fn}")
-                sys.exit(1)
-    except FileNotFoundError:
+    # Shares the parse with get_aliases and get_default_project
+    dot_shalev_dict = read_config(fn)
+    if dot_shalev_dict is None:
         print(f"Error: {fn} file does not exist, try:\n\t shalev config -w <workspace folder location>", file=sys.stderr)
         sys.exit(1)
+    if "workspace_folder" in dot_shalev_dict:
+        workspace_folder = dot_shalev_dict["workspace_folder"]
+    else:
+        print(f"workspace_folder is not properly set in {fn}")
+        sys.exit(1)
     # print("QQQQ:", workspace_folder) todo - log this is our workspace_folder
     try:
         fn = os.path.join(workspace_folder, "workspace_config.yaml")
-        with open(fn) as config_file:
-            try:
-                workspace_dict = yaml.safe_load(config_file)
-            except yaml.YAMLError as e:
-                print("YAML error:", e, file=sys.stderr)
-                sys.exit(1)
-            workspace_data = workspace_from_dict(workspace_dict, dot_shalev_dict["workspace_folder"])
-            missing_folders = check_workspace_data_valid(workspace_data)
-            if missing_folders:
-                print("Missing required folders:")
+        try:
+            workspace_dict = load_workspace_config(fn)
+        except yaml.YAMLError as e:
+            print("YAML error:", e, file=sys.stderr)
+            sys.exit(1)
+        workspace_data = workspace_from_dict(workspace_dict, dot_shalev_dict["workspace_folder"])
+        missing_folders = check_workspace_data_valid(workspace_data)
+        if missing_folders:
+            print("Missing required folders:")
+            for folder in missing_folders:
+                print(f"  {folder}")
+            answer = input("Create these folders? [y/n]: ").strip().lower()
+            if answer == "y":
                 for folder in missing_folders:
-                    print(f"  {folder}")
-                answer = input("Create these folders? [y/n]: ").strip().lower()
-                if answer == "y":
-                    for folder in missing_folders:
-                        os.makedirs(folder, exist_ok=True)
-                        print(f"  Created: {folder}")
-                else:
-                    sys.exit(1)
-            check_workspace_health(workspace_data, workspace_folder)
-            return workspace_data
+                    os.makedirs(folder, exist_ok=True)
+                    print(f"  Created: {folder}")
+            else:
+                sys.exit(1)
+        check_workspace_health(workspace_data, workspace_folder)
+        return workspace_data
     except FileNotFoundError:
         print(f"Error: {fn} file does not exist, try:\n\t shalev config -w <workspace folder location>", file=sys.stderr)
         sys.exit(1)
@@ -10,6 +10,15 @@ from shalev.shalev_eachrun_setup import workspace_from_dict
 import yaml
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep shalev's on-disk caches out of the real user cache folder."""
+    import shalev.shalev_config
+    cache_dir = tmp_path / 'shalev_cache'
+    monkeypatch.setattr(shalev.shalev_config, 'CACHE_DIR', str(cache_dir))
+    return cache_dir
+
+
 @pytest.fixture
 def test_workspace_path():
     """Return the path to the test workspace fixture."""
@@ -35,3 +44,14 @@ def test_project(test_workspace_data):
 def components_folder(test_project):
     """Return the path to the components folder."""
     return test_project.components_folder
+
+
+@pytest.fixture
+def tmp_workspace_data(test_workspace_path, tmp_path):
+    """Load a writable copy of the test workspace."""
+    import shutil
+    workspace_path = str(tmp_path / 'test_workspace')
+    shutil.copytree(test_workspace_path, workspace_path)
+    with open(os.path.join(workspace_path, 'workspace_config.yaml')) as f:
+        config_dict = yaml.safe_load(f)
+    return workspace_from_dict(config_dict, workspace_path)
@@ -1,7 +1,7 @@
 """Tests for agent functions."""
 import os
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 
 from shalev.agent_actions.agent import (
     make_LLM_messages_single_component,
@@ -82,6 +82,15 @@ class TestMessageBuilders:
         assert '**TARGET**' in content
         assert 'Target text' in content
 
+    def test_system_message_reused(self, test_workspace_data):
+        """Test that the system message is built once per action prompt."""
+        configs = load_agent_configs_from_folder(test_workspace_data.action_prompts_folder)
+        action_prompt = configs['echo']
+        first = make_LLM_messages_single_component(action_prompt, "a")
+        second = make_LLM_messages_source_and_dest_components(action_prompt, "b", "c")
+        assert first[0] is second[0]
+        assert first[0]['content'] == action_prompt.system_prompt['content']
+
     def test_multi_input_message_order(self, test_workspace_data):
         """Test that inputs appear before target in the message."""
         configs = load_agent_configs_from_folder(test_workspace_data.action_prompts_folder)
@@ -114,6 +123,133 @@ class TestActionPromptLoading:
         assert 'stm' in configs
         assert configs['stm'].agent_command_name == 'stm'
 
+    def test_configs_cached_until_file_changes(self, tmp_path):
+        """Test that parsed configs are reused until a YAML file changes."""
+        prompt_path = tmp_path / 'echo.yaml'
+        prompt_path.write_text(
+            "agent_command_name: echo\n"
+            "main_source_label: x\n"
+            "system_prompt: {content: one}\n"
+            "user_prompt: {content: x}\n"
+        )
+        first = load_agent_configs_from_folder(str(tmp_path))
+        second = load_agent_configs_from_folder(str(tmp_path))
+        assert first['echo'] is second['echo']
+
+        prompt_path.write_text(
+            "agent_command_name: echo\n"
+            "main_source_label: x\n"
+            "system_prompt: {content: two, changed: true}\n"
+            "user_prompt: {content: x}\n"
+        )
+        third = load_agent_configs_from_folder(str(tmp_path))
+        assert third['echo'].system_prompt['content'] == 'two'
+
+    def test_unchanged_files_reused_when_another_changes(self, tmp_path):
+        """Test that editing one prompt file doesn't reload the others."""
+        for name in ('one', 'two'):
+            (tmp_path / f'{name}.yaml').write_text(
+                f"agent_command_name: {name}\n"
+                "main_source_label: x\n"
+                "system_prompt: {content: a}\n"
+                "user_prompt: {content: x}\n"
+            )
+        first = load_agent_configs_from_folder(str(tmp_path))
+        (tmp_path / 'two.yaml').write_text(
+            "agent_command_name: two\n"
+            "main_source_label: x\n"
+            "system_prompt: {content: changed}\n"
+            "user_prompt: {content: x}\n"
+        )
+        second = load_agent_configs_from_folder(str(tmp_path))
+        assert second['one'] is first['one']
+        assert second['two'].system_prompt['content'] == 'changed'
+
+    def test_refresh_rereads_same_size_edit(self, tmp_path):
+        """Test that refresh_agent_configs picks up an edit the stat check can't see."""
+        from shalev.agent_actions.agent import refresh_agent_configs
+        prompt_path = tmp_path / 'echo.yaml'
+        prompt_path.write_text("agent_command_name: echo\nmain_source_label: x\nsystem_prompt: {content: aa}\nuser_prompt: {content: x}\n")
+        st = os.stat(prompt_path)
+        assert load_agent_configs_from_folder(str(tmp_path))['echo'].system_prompt['content'] == 'aa'
+
+        prompt_path.write_text("agent_command_name: echo\nmain_source_label: x\nsystem_prompt: {content: bb}\nuser_prompt: {content: x}\n")
+        os.utime(prompt_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        refresh_agent_configs()
+        assert load_agent_configs_from_folder(str(tmp_path))['echo'].system_prompt['content'] == 'bb'
+
+    def test_configs_snapshot_skips_yaml_in_new_process(self, test_workspace_data, isolated_cache_dir):
+        """Test that the JSON snapshot is used when the in-memory caches are cold."""
+        from shalev.agent_actions import agent
+        folder = test_workspace_data.action_prompts_folder
+        agent._configs_cache.clear()
+        agent._prompt_file_cache.clear()
+        load_agent_configs_from_folder(folder)
+        assert [p.suffix for p in isolated_cache_dir.iterdir()] == ['.json']
+
+        agent._configs_cache.clear()
+        agent._prompt_file_cache.clear()
+        with patch.object(agent, '_load_action_prompt', side_effect=AssertionError("read YAML")):
+            configs = load_agent_configs_from_folder(folder)
+        assert configs['echo'].system_prompt['content'].startswith('Return the input text')
+
+    def test_configs_snapshot_keeps_eagerly_parsed_prompts(self, tmp_path, isolated_cache_dir):
+        """Test that prompts parsed up front round-trip through the snapshot."""
+        from shalev.agent_actions import agent
+        (tmp_path / 'echo.yaml').write_text(
+            "agent_command_name: \"echo it\"\n"
+            "main_source_label: x\n"
+            "system_prompt: {content: hi}\n"
+            "user_prompt: {content: x}\n"
+        )
+        load_agent_configs_from_folder(str(tmp_path))
+        agent._configs_cache.clear()
+        agent._prompt_file_cache.clear()
+        with patch.object(agent, '_load_action_prompt', side_effect=AssertionError("read YAML")):
+            configs = load_agent_configs_from_folder(str(tmp_path), include_category=True)
+        prompt, category = configs['echo it']
+        assert prompt.system_prompt == {'content': 'hi'}
+        assert category == 'uncategorized'
+
+    def test_configs_snapshot_skipped_for_non_string_keys(self, tmp_path, isolated_cache_dir):
+        """Test that prompts JSON can't round-trip are re-read from YAML rather than snapshotted."""
+        from shalev.agent_actions import agent
+        (tmp_path / 'echo.yaml').write_text(
+            "agent_command_name: \"echo it\"\n"
+            "main_source_label: x\n"
+            "system_prompt: {content: hi, 1: one}\n"
+            "user_prompt: {content: x}\n"
+        )
+        load_agent_configs_from_folder(str(tmp_path))
+        assert not list(isolated_cache_dir.glob('*.json'))
+        agent._configs_cache.clear()
+        agent._prompt_file_cache.clear()
+        assert load_agent_configs_from_folder(str(tmp_path))['echo it'].system_prompt[1] == 'one'
+
+    def test_prompt_parsed_only_when_used(self, tmp_path):
+        """Test that loading only reads the name and parsing waits for field access."""
+        (tmp_path / 'echo.yaml').write_text(
+            "agent_command_name: echo\n"
+            "main_source_label: x\n"
+            "system_prompt: {content: hi}\n"
+            "user_prompt: {content: x}\n"
+        )
+        with patch('shalev.agent_actions.agent.yaml.load', side_effect=AssertionError("parsed YAML")):
+            configs = load_agent_configs_from_folder(str(tmp_path))
+            assert configs['echo'].agent_command_name == 'echo'
+        assert configs['echo'].system_prompt['content'] == 'hi'
+
+    def test_quoted_command_name_is_parsed(self, tmp_path):
+        """Test that a name the quick scan can't read falls back to a full parse."""
+        (tmp_path / 'echo.yaml').write_text(
+            "agent_command_name: \"echo it\"\n"
+            "main_source_label: x\n"
+            "system_prompt: {content: hi}\n"
+            "user_prompt: {content: x}\n"
+        )
+        configs = load_agent_configs_from_folder(str(tmp_path))
+        assert configs['echo it'].system_prompt['content'] == 'hi'
+
 
 class TestSizeLimit:
     """Tests for size limit constant."""
@@ -130,6 +266,25 @@ class TestSizeLimit:
                 size = os.path.getsize(filepath)
                 assert size < SIZE_LIMIT, f"{filename} exceeds size limit"
 
+    def test_oversize_component_rejected(self, tmp_path):
+        """Test that reading a component over the limit exits."""
+        from shalev.agent_actions.agent import read_component_file
+        (tmp_path / 'big.tex').write_text('x' * (SIZE_LIMIT + 1))
+        with pytest.raises(SystemExit):
+            read_component_file(str(tmp_path), 'big.tex')
+
+    def test_component_at_limit_read(self, tmp_path):
+        """Test that a component exactly at the limit is read in full."""
+        from shalev.agent_actions.agent import read_component_file
+        (tmp_path / 'full.tex').write_bytes(b'x' * SIZE_LIMIT)
+        assert read_component_file(str(tmp_path), 'full.tex')[1] == 'x' * SIZE_LIMIT
+
+    def test_crlf_read_as_newlines(self, tmp_path):
+        """Test that Windows line endings come back as newlines."""
+        from shalev.agent_actions.agent import read_component_file
+        (tmp_path / 'ch1.tex').write_bytes('a\r\nb é\r\n'.encode('utf-8'))
+        assert read_component_file(str(tmp_path), 'ch1.tex') == ('ch1.tex', 'a\nb é\n')
+
 
 class TestFindSimilarComponents:
     """Tests for component suggestion when file not found."""
@@ -154,3 +309,534 @@ class TestFindSimilarComponents:
         suggestions = find_similar_components(components_folder, 'xyznonexistent123')
         # Should be empty or very few suggestions
         assert len(suggestions) <= 2
+
+    def test_finds_basename_in_subdirectory(self, tmp_path):
+        """Test that a bare name matches a file in a nested folder."""
+        from shalev.agent_actions.agent import find_similar_components
+        (tmp_path / 'chapters' / 'part1').mkdir(parents=True)
+        (tmp_path / 'chapters' / 'part1' / 'intro.tex').write_text('x')
+        (tmp_path / 'root.tex').write_text('x')
+        suggestions = find_similar_components(str(tmp_path), 'intro')
+        assert suggestions[0] == os.path.join('chapters', 'part1', 'intro.tex')
+
+    @pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason="needs os.mkfifo")
+    def test_fifo_not_opened(self, tmp_path):
+        """Test that a FIFO named as a component is treated as missing instead of blocking."""
+        import threading
+        from shalev.agent_actions.agent import read_component_file
+        os.mkfifo(tmp_path / 'intro.tex')
+        (tmp_path / 'intro_notes.tex').write_text('notes')
+        result = []
+        reader = threading.Thread(target=lambda: result.append(read_component_file(str(tmp_path), 'intro.tex')),
+                                  daemon=True)
+        reader.start()
+        reader.join(5)
+        assert not reader.is_alive(), "read_component_file blocked on the FIFO"
+        assert result == [('intro_notes.tex', 'notes')]
+
+    def test_missing_components_folder(self, tmp_path):
+        """Test that a components folder that doesn't exist gives no suggestions."""
+        from shalev.agent_actions.agent import find_similar_components
+        assert find_similar_components(str(tmp_path / 'missing'), 'intro') == []
+
+    def test_extension_match_skips_other_suggestions(self, components_folder):
+        """Test that an extension hit is returned without fuzzy extras."""
+        from shalev.agent_actions.agent import find_similar_components
+        assert find_similar_components(components_folder, 'ch1') == ['ch1.tex']
+
+    def test_oversize_suggestion_skipped(self, tmp_path):
+        """Test that auto-resolution passes over suggestions that are too large."""
+        from shalev.agent_actions.agent import read_component_file
+        (tmp_path / 'intro.tex').write_text('x' * (SIZE_LIMIT + 1))
+        (tmp_path / 'intro.md').write_text('small')
+        assert read_component_file(str(tmp_path), 'intro') == ('intro.md', 'small')
+
+    def test_full_fuzzy_pass_skips_extensionless_pass(self, tmp_path):
+        """Test that the extensionless fuzzy pass only runs when suggestions are missing."""
+        from shalev.agent_actions import agent
+        for i in range(6):
+            (tmp_path / f'sec{i}.tex').write_text('x')
+        with patch.object(agent, '_close_matches', wraps=agent._close_matches) as close_matches:
+            suggestions = agent.find_similar_components(str(tmp_path), 'sec9.tex')
+        assert len(suggestions) == 5
+        assert close_matches.call_count == 1
+
+    def test_basename_index_reused_until_listing_changes(self, tmp_path):
+        """Test that the basename index is rebuilt only for a new listing."""
+        from shalev.agent_actions.agent import _component_basename_index
+        (tmp_path / 'a.tex').write_text('x')
+        first = _component_basename_index(str(tmp_path))
+        assert _component_basename_index(str(tmp_path)) is first
+
+        (tmp_path / 'b.tex').write_text('x')
+        _, by_basename, by_name_no_ext = _component_basename_index(str(tmp_path))
+        assert by_basename['b.tex'] == ['b.tex']
+        assert by_name_no_ext['b'] == ['b.tex']
+
+    def test_close_matches_without_rapidfuzz(self):
+        """Test that fuzzy matching falls back to difflib when rapidfuzz is missing."""
+        import sys
+        from shalev.agent_actions.agent import _close_matches
+        names = ['sec1_1.tex', 'sec1_2.tex', 'root.tex']
+        with_fast = _close_matches('sec1_3.tex', names, n=5)
+        with patch.dict(sys.modules, {'rapidfuzz': None}):
+            without_fast = _close_matches('sec1_3.tex', names, n=5)
+        assert sorted(with_fast) == sorted(without_fast) == ['sec1_1.tex', 'sec1_2.tex']
+
+    def test_component_listing_sees_new_nested_file(self, tmp_path):
+        """Test that the cached listing is refreshed when a subfolder changes."""
+        from shalev.agent_actions.agent import _list_component_files
+        (tmp_path / 'chapters').mkdir()
+        (tmp_path / 'chapters' / 'a.tex').write_text('x')
+        assert _list_component_files(str(tmp_path)) == (os.path.join('chapters', 'a.tex'),)
+
+        assert _list_component_files(os.path.join(str(tmp_path), '')) == (os.path.join('chapters', 'a.tex'),)
+
+        (tmp_path / 'chapters' / 'b.tex').write_text('x')
+        assert sorted(_list_component_files(str(tmp_path))) == [
+            os.path.join('chapters', 'a.tex'), os.path.join('chapters', 'b.tex')
+        ]
+
+
+class TestMultiInputManyTargets:
+    """Tests for running a multi-input action on several targets at once."""
+
+    @staticmethod
+    def _mock_async_client(create):
+        client = MagicMock()
+        client.close = AsyncMock()
+        client.chat.completions.create = create
+        return client
+
+    @staticmethod
+    def _response(text):
+        response = MagicMock()
+        response.choices[0].message.content = text
+        return response
+
+    def test_each_target_gets_its_own_response(self, tmp_workspace_data, monkeypatch):
+        """Test that every target is sent once and overwritten with its reply."""
+        from shalev.agent_actions.agent import agent_action_multi_input_many_targets
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+
+        async def reply(model, messages):
+            target = messages[1]['content'].rsplit('**TARGET**', 1)[1]
+            return self._response('rewritten ' + str(len(target)))
+
+        create = AsyncMock(side_effect=reply)
+        client = self._mock_async_client(create)
+        with patch('openai.AsyncOpenAI', return_value=client):
+            agent_action_multi_input_many_targets(
+                tmp_workspace_data, 'stm',
+                [('testproj', 'example_style.tex')],
+                [('testproj', 'sec1_1.tex'), ('testproj', 'sec1_2.tex')],
+            )
+
+        assert create.await_count == 2
+        client.close.assert_awaited_once()
+        folder = tmp_workspace_data.projects['testproj'].components_folder
+        for name in ('sec1_1.tex', 'sec1_2.tex'):
+            with open(os.path.join(folder, name)) as f:
+                assert f.read().startswith('rewritten ')
+
+    def test_failed_target_does_not_stop_others(self, tmp_workspace_data, monkeypatch):
+        """Test that one failing request still lets the other targets be written."""
+        from shalev.agent_actions.agent import agent_action_multi_input_many_targets
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+        create = AsyncMock(side_effect=[RuntimeError('boom'), self._response('ok')])
+        client = self._mock_async_client(create)
+        with patch('openai.AsyncOpenAI', return_value=client), pytest.raises(SystemExit):
+            agent_action_multi_input_many_targets(
+                tmp_workspace_data, 'stm',
+                [('testproj', 'example_style.tex')],
+                [('testproj', 'sec1_1.tex'), ('testproj', 'sec1_2.tex')],
+            )
+
+        folder = tmp_workspace_data.projects['testproj'].components_folder
+        with open(os.path.join(folder, 'sec1_2.tex')) as f:
+            assert f.read() == 'ok'
+
+    def test_duplicate_targets_edited_once(self, tmp_workspace_data, monkeypatch, capsys):
+        """Test that targets resolving to the same file are sent once, so no edit is lost."""
+        from shalev.agent_actions.agent import agent_action_single_component_many
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+        create = AsyncMock(return_value=self._response('rewritten'))
+        client = self._mock_async_client(create)
+        with patch('openai.AsyncOpenAI', return_value=client):
+            agent_action_single_component_many(tmp_workspace_data, 'echo', 'testproj', ['sec1_1.tex', 'sec1_1'])
+
+        assert create.await_count == 1
+        assert "Skipping 1 target(s)" in capsys.readouterr().err
+        folder = tmp_workspace_data.projects['testproj'].components_folder
+        with open(os.path.join(folder, 'sec1_1.tex')) as f:
+            assert f.read() == 'rewritten'
+
+
+class TestReadInputComponents:
+    """Tests for reading the inputs of a multi-input action."""
+
+    def test_inputs_keep_their_order(self, test_workspace_data, components_folder):
+        """Test that concurrently read inputs come back in the order given."""
+        from shalev.agent_actions.agent import read_input_components
+        names = ['ch2.tex', 'ch1.tex', 'root.tex', 'sec1_1.tex']
+        texts = read_input_components(
+            test_workspace_data, [('testproj', name) for name in names]
+        )
+        expected = []
+        for name in names:
+            with open(os.path.join(components_folder, name), encoding='utf-8') as f:
+                expected.append(f.read())
+        assert texts == expected
+
+    def test_duplicate_inputs_sent_once(self, test_workspace_data, tmp_path, capsys):
+        """Test that repeated or identical inputs are only included once."""
+        from shalev.agent_actions.agent import read_input_components
+        test_workspace_data.projects['testproj'].components_folder = str(tmp_path)
+        (tmp_path / 'a.tex').write_text('same')
+        (tmp_path / 'b.tex').write_text('same')
+        (tmp_path / 'c.tex').write_text('other')
+        texts = read_input_components(
+            test_workspace_data,
+            [('testproj', 'a.tex'), ('testproj', 'c.tex'), ('testproj', 'b.tex'), ('testproj', 'a.tex')],
+        )
+        assert texts == ['same', 'other']
+        assert "Skipping 2 input component(s)" in capsys.readouterr().err
+
+    def test_repeated_input_reported(self, test_workspace_data, tmp_path, capsys):
+        """Test that the same component listed twice is reported as skipped."""
+        from shalev.agent_actions.agent import read_input_components
+        test_workspace_data.projects['testproj'].components_folder = str(tmp_path)
+        (tmp_path / 'a.tex').write_text('same')
+        texts = read_input_components(test_workspace_data, [('testproj', 'a.tex'), ('testproj', 'a.tex')])
+        assert texts == ['same']
+        assert "Skipping 1 input component(s)" in capsys.readouterr().err
+
+    def test_missing_input_exits(self, test_workspace_data):
+        """Test that a missing input still stops the action."""
+        from shalev.agent_actions.agent import read_input_components
+        with pytest.raises(SystemExit):
+            read_input_components(
+                test_workspace_data,
+                [('testproj', 'ch1.tex'), ('testproj', 'xyznonexistent123')],
+                exact=True,
+            )
+
+    def test_size_check_counts_bytes(self):
+        """Test that the multi-input limit is in UTF-8 bytes, not characters."""
+        from shalev.agent_actions.agent import check_multi_input_size
+        limit = SIZE_LIMIT * 3
+        check_multi_input_size(['x' * limit])
+        with pytest.raises(SystemExit):
+            check_multi_input_size(['x' * (limit - 1), 'é'])
+        with pytest.raises(SystemExit):
+            check_multi_input_size(['x' * limit, 'y'])
+
+
+class TestAsyncClient:
+    """Tests for the shared AsyncOpenAI client."""
+
+    def test_shared_within_a_loop(self, monkeypatch):
+        """Test that one loop gets one client and a new loop gets a fresh one."""
+        import asyncio
+        from shalev.agent_actions import agent
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+
+        async def get_twice():
+            try:
+                return agent.get_async_client(), agent.get_async_client()
+            finally:
+                await agent._close_async_client()
+
+        with patch('openai.AsyncOpenAI', side_effect=lambda **kwargs: MagicMock(close=AsyncMock())) as cls:
+            first, second = asyncio.run(get_twice())
+            third, _ = asyncio.run(get_twice())
+        assert first is second
+        assert third is not first
+        assert cls.call_count == 2
+        first.close.assert_awaited_once()
+
+
+class TestStreamToComponent:
+    """Tests for streaming an LLM response into a component file."""
+
+    @staticmethod
+    def _chunk(text):
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = text
+        return chunk
+
+    def test_chunks_written_to_component(self, tmp_path):
+        """Test that streamed chunks end up in the component."""
+        from shalev.agent_actions.agent import stream_LLM_to_component
+        path = tmp_path / 'ch1.tex'
+        path.write_text('old')
+        client = MagicMock()
+        client.chat.completions.create.return_value = iter(
+            [self._chunk('new '), self._chunk(None), self._chunk('text é')]
+        )
+        with patch('shalev.agent_actions.agent.get_client', return_value=client):
+            stream_LLM_to_component([], str(path))
+        assert path.read_text(encoding='utf-8') == 'new text é'
+        assert client.chat.completions.create.call_args.kwargs['stream'] is True
+        assert os.listdir(tmp_path) == ['ch1.tex']
+
+    def test_identical_response_leaves_file_alone(self, tmp_path):
+        """Test that a response matching the file byte for byte isn't written."""
+        from shalev.agent_actions.agent import stream_LLM_to_component
+        path = tmp_path / 'ch1.tex'
+        path.write_text('same text')
+        os.utime(path, ns=(1, 1))
+        client = MagicMock()
+        client.chat.completions.create.return_value = iter([self._chunk('same '), self._chunk('text')])
+        with patch('shalev.agent_actions.agent.get_client', return_value=client):
+            stream_LLM_to_component([], str(path))
+        assert os.stat(path).st_mtime_ns == 1
+        assert os.listdir(tmp_path) == ['ch1.tex']
+
+    def test_failed_stream_keeps_original(self, tmp_path):
+        """Test that an error mid-stream leaves the component untouched."""
+        from shalev.agent_actions.agent import stream_LLM_to_component
+        path = tmp_path / 'ch1.tex'
+        path.write_text('old')
+
+        def broken_stream():
+            yield self._chunk('partial')
+            raise ConnectionResetError('connection reset')
+
+        client = MagicMock()
+        client.chat.completions.create.return_value = broken_stream()
+        with patch('shalev.agent_actions.agent.get_client', return_value=client), pytest.raises(SystemExit):
+            stream_LLM_to_component([], str(path))
+        assert path.read_text() == 'old'
+        assert os.listdir(tmp_path) == ['ch1.tex']
+
+    def test_write_failure_not_blamed_on_api(self, tmp_path, capsys):
+        """Test that a local write error is reported as such and the temp file removed."""
+        from shalev.agent_actions.agent import stream_LLM_to_component
+        path = tmp_path / 'ch1.tex'
+        path.write_text('old')
+        real_fdopen = os.fdopen
+
+        def full_disk_fdopen(*args, **kwargs):
+            f = real_fdopen(*args, **kwargs)
+            f.write = MagicMock(side_effect=OSError(28, 'No space left on device'))
+            return f
+
+        client = MagicMock()
+        client.chat.completions.create.return_value = iter([self._chunk('new')])
+        with patch('shalev.agent_actions.agent.get_client', return_value=client), \
+                patch('shalev.agent_actions.agent.os.fdopen', side_effect=full_disk_fdopen), \
+                pytest.raises(SystemExit):
+            stream_LLM_to_component([], str(path))
+        captured = capsys.readouterr()
+        assert 'Could not write' in captured.err
+        assert 'OpenAI API error' not in captured.out
+        assert path.read_text() == 'old'
+        assert os.listdir(tmp_path) == ['ch1.tex']
+
+
+class TestCompareStringsSuccinct:
+    """Tests for the line-level diff printer."""
+
+    # (original, corrected, printed lines), the same whichever diff is used
+    CASES = [
+        ("one\ntwo\nthree\n", "one\n2\nthree\n", ['-two', '+2']),
+        ("a\nb\nc\nd\n", "a\nB\nC\nd\n", ['-b', '+B', '-c', '+C']),
+        ("a\nc\n", "a\nb\nc\n", ['+b']),
+        ("a\nb\nc\n", "a\nc\n", ['-b']),
+    ]
+
+    def test_prints_changed_lines(self, capsys):
+        """Test that only the edited lines are printed, using rapidfuzz."""
+        pytest.importorskip('rapidfuzz')
+        from shalev.agent_actions.agent import compare_strings_succinct
+        for original, corrected, expected in self.CASES:
+            compare_strings_succinct(original, corrected)
+            assert capsys.readouterr().out.splitlines() == expected
+
+    def test_falls_back_without_rapidfuzz(self, capsys):
+        """Test that the difflib fallback prints the same lines when rapidfuzz is missing."""
+        import sys
+        from shalev.agent_actions.agent import compare_strings_succinct
+        with patch.dict(sys.modules, {'rapidfuzz': None, 'rapidfuzz.distance': None}):
+            for original, corrected, expected in self.CASES:
+                compare_strings_succinct(original, corrected)
+                assert capsys.readouterr().out.splitlines() == expected
+
+
+class TestOverwriteComponent:
+    """Tests for writing a revised component."""
+
+    def test_writes_changed_text(self, tmp_path):
+        """Test that new content replaces the file."""
+        from shalev.agent_actions.agent import overwrite_component
+        path = tmp_path / 'ch1.tex'
+        path.write_text('old')
+        overwrite_component(str(path), 'new é')
+        assert path.read_text(encoding='utf-8') == 'new é'
+
+    def test_identical_text_not_rewritten(self, tmp_path, capsys):
+        """Test that identical content skips the write."""
+        from shalev.agent_actions.agent import overwrite_component
+        path = tmp_path / 'ch1.tex'
+        path.write_text('same')
+        os.utime(path, ns=(1, 1))
+        overwrite_component(str(path), 'same')
+        assert os.stat(path).st_mtime_ns == 1
+        assert 'left untouched' in capsys.readouterr().out
+
+    def test_overwrite_keeps_mode_and_symlink(self, tmp_path):
+        """Test that the atomic rewrite keeps permissions and writes through symlinks."""
+        from shalev.agent_actions.agent import overwrite_component
+        target = tmp_path / 'real.tex'
+        target.write_text('old')
+        os.chmod(target, 0o640)
+        link = tmp_path / 'link.tex'
+        link.symlink_to(target)
+        overwrite_component(str(link), 'new')
+        assert link.is_symlink()
+        assert target.read_text() == 'new'
+        assert os.stat(target).st_mode & 0o777 == 0o640
+        assert sorted(os.listdir(tmp_path)) == ['link.tex', 'real.tex']
+
+
+class TestHttpClientOptions:
+    """Tests for the optional HTTP/2 client setup."""
+
+    def test_default_client_without_h2(self):
+        """Test that the SDK's own pooled client is used when h2 is missing."""
+        import sys
+        from shalev.agent_actions.agent import _http_client_options
+        with patch.dict(sys.modules, {'h2': None}):
+            assert _http_client_options() == {}
+
+    def test_http2_client_with_h2(self):
+        """Test that HTTP/2 is enabled when h2 is installed."""
+        import sys
+        import types
+        from shalev.agent_actions.agent import _http_client_options
+        with patch.dict(sys.modules, {'h2': types.ModuleType('h2')}), \
+                patch('openai.DefaultAsyncHttpxClient') as http_client_class:
+            options = _http_client_options(async_client=True)
+        http_client_class.assert_called_once_with(http2=True)
+        assert options == {'http_client': http_client_class.return_value}
+
+
+class TestFindComposeTarget:
+    """Tests for finding the compose target that includes a component."""
+
+    def _project(self, test_project, tmp_path):
+        (tmp_path / 'chapters').mkdir()
+        (tmp_path / 'chap1.tex').write_text('\\chapter{One}\n  !!!>include(sec1_1.tex)  \n')
+        (tmp_path / 'chapters' / 'chap2.tex').write_text('!!!>include(sections/sec2_1.tex)\r\n')
+        test_project.components_folder = str(tmp_path)
+        test_project.compose_targets = {'one': 'chap1.tex', 'two': 'chap2.tex'}
+        return test_project
+
+    def test_direct_include(self, test_project, tmp_path):
+        """Test that an include in a target file resolves to that target."""
+        from shalev.agent_actions.agent import find_compose_target
+        project = self._project(test_project, tmp_path)
+        assert find_compose_target(project, 'sec1_1.tex') == 'one'
+        assert find_compose_target(project, 'chap1.tex') == 'one'
+
+    def test_include_in_chapters_folder(self, test_project, tmp_path):
+        """Test that includes found under chapters/ map back to their target."""
+        from shalev.agent_actions.agent import find_compose_target
+        project = self._project(test_project, tmp_path)
+        assert find_compose_target(project, 'sec2_1.tex') == 'two'
+
+    def test_no_target(self, test_project, tmp_path):
+        """Test that an unreferenced component has no target."""
+        from shalev.agent_actions.agent import find_compose_target
+        project = self._project(test_project, tmp_path)
+        assert find_compose_target(project, 'standalone.tex') is None
+
+    def test_each_file_scanned_once(self, test_project, tmp_path):
+        """Test that a target inside chapters/ isn't read a second time."""
+        from shalev.agent_actions import agent
+        project = self._project(test_project, tmp_path)
+        project.compose_targets = {'two': os.path.join('chapters', 'chap2.tex')}
+        with patch.object(agent, '_includes_basename', wraps=agent._includes_basename) as includes:
+            assert agent.find_compose_target(project, 'missing.tex') is None
+        assert includes.call_count == 1
+
+
+class TestInteractiveInput:
+    """Tests for choosing the interactive input reader."""
+
+    def test_no_prompt_toolkit_reader_when_missing(self):
+        """Test that the termios reader is used when prompt_toolkit is missing."""
+        import sys
+        from shalev.agent_actions.agent import _prompt_toolkit_reader
+        with patch.dict(sys.modules, {'prompt_toolkit': None}):
+            assert _prompt_toolkit_reader() is None
+
+
+class TestGetClient:
+    """Tests for the shared OpenAI client."""
+
+    def test_client_created_once(self, monkeypatch):
+        """Test that the client is constructed on first use and then reused."""
+        from shalev.agent_actions import agent
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+        agent.get_client.cache_clear()
+        try:
+            with patch.object(agent, '_construct_client', side_effect=[SystemExit(1), 'client']) as construct:
+                with pytest.raises(SystemExit):
+                    agent.get_client()
+                assert agent.get_client() == 'client'
+                assert agent.get_client() == 'client'
+            assert construct.call_count == 2
+        finally:
+            agent.get_client.cache_clear()
+
+    def test_client_warmed_up_while_reading(self, monkeypatch, tmp_workspace_data):
+        """Test that the action constructs the client in the background and streams with it."""
+        from shalev.agent_actions import agent
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+        agent.get_client.cache_clear()
+        try:
+            with patch.object(agent, '_construct_client', return_value='client') as construct, \
+                    patch.object(agent, 'stream_LLM_to_component') as stream:
+                agent.agent_action_single_component(tmp_workspace_data, 'echo', 'testproj', 'ch1.tex')
+                assert stream.called
+                assert agent.get_client() == 'client'
+            construct.assert_called_once()
+        finally:
+            agent.get_client.cache_clear()
+
+    def test_no_warmup_without_api_key(self, monkeypatch):
+        """Test that a missing key is left for get_client to report in the foreground."""
+        from shalev.agent_actions import agent
+        monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+        agent.get_client.cache_clear()
+        with patch.object(agent, 'get_openai_api_key', return_value=None):
+            assert agent._start_client_warmup() is None
+
+
+class TestSourceAndDestComponents:
+    """Tests for the source/dest agent action."""
+
+    def test_reads_both_and_writes_dest(self, tmp_workspace_data):
+        """Test that source and dest are both sent and only dest is rewritten."""
+        from shalev.agent_actions.agent import agent_action_source_and_dest_components
+        folder = tmp_workspace_data.projects['testproj'].components_folder
+        with open(os.path.join(folder, 'ch1.tex')) as f:
+            source_text = f.read()
+        with patch('shalev.agent_actions.agent.stream_LLM_to_component') as stream:
+            agent_action_source_and_dest_components(
+                tmp_workspace_data, 'echo', 'testproj', 'ch1.tex', 'testproj', 'ch2'
+            )
+        messages, dest_path = stream.call_args.args
+        assert source_text in messages[1]['content']
+        assert dest_path == os.path.join(folder, 'ch2.tex')
+
+    def test_missing_source_exits(self, tmp_workspace_data):
+        """Test that a missing source still stops the action."""
+        from shalev.agent_actions.agent import agent_action_source_and_dest_components
+        with patch('shalev.agent_actions.agent.stream_LLM_to_component') as stream, pytest.raises(SystemExit):
+            agent_action_source_and_dest_components(
+                tmp_workspace_data, 'echo', 'testproj', 'xyznonexistent123', 'testproj', 'ch2.tex', exact=True
+            )
+        stream.assert_not_called()
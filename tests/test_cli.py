@@ -25,6 +25,33 @@ class TestCliBasic:
         assert '--inputs' in result.output
         assert '--targets' in result.output
 
+    def test_verbose_logging_added_once(self):
+        """Test that enabling verbose logging twice doesn't duplicate messages."""
+        import logging
+        from shalev import cli as cli_module
+        root = logging.getLogger()
+        before = len(root.handlers)
+        try:
+            cli_module.enable_verbose_logging()
+            cli_module.enable_verbose_logging()
+            assert len(root.handlers) == before + 1
+        finally:
+            root.removeHandler(cli_module._verbose_handler)
+
+    def test_setup_logging_runs_once(self, monkeypatch):
+        """Test that a second setup_logging call keeps existing handlers."""
+        import logging
+        from shalev import cli as cli_module
+        root = logging.getLogger()
+        handler = logging.NullHandler()
+        monkeypatch.setattr(cli_module, '_logging_configured', True)
+        root.addHandler(handler)
+        try:
+            cli_module.setup_logging()
+            assert handler in root.handlers
+        finally:
+            root.removeHandler(handler)
+
 
 class TestAgentCommand:
     """Tests for the agent command."""
@@ -84,6 +111,83 @@ class TestAgentCommand:
             assert result.exit_code != 0
             assert 'input' in result.output.lower()
 
+    def test_agent_all_mode_batches_requests(self, test_workspace_path):
+        """Test that --all over several files goes through the concurrent path."""
+        runner = CliRunner()
+        shalev_config = f"workspace_folder: {test_workspace_path}\n"
+        with runner.isolated_filesystem():
+            with open('.shalev.yaml', 'w') as f:
+                f.write(shalev_config)
+            with patch('shalev.agent_actions.agent_action_single_component_many') as many, \
+                    patch('shalev.agent_actions.agent_action_single_component') as single:
+                result = runner.invoke(cli, ['agent', 'echo', 'testproj~.', '--all', 'tex'])
+            assert result.exit_code == 0, result.output
+            single.assert_not_called()
+            _, action, project, components = many.call_args.args
+            assert (action, project) == ('echo', 'testproj')
+            assert components == sorted(components)
+            assert [os.path.basename(c) for c in components][:2] == ['ch1.tex', 'ch2.tex']
+
+    def test_agent_flag_mode_many_targets_batches_requests(self, test_workspace_path):
+        """Test that several --targets go through the concurrent path."""
+        runner = CliRunner()
+        shalev_config = f"workspace_folder: {test_workspace_path}\n"
+        with runner.isolated_filesystem():
+            with open('.shalev.yaml', 'w') as f:
+                f.write(shalev_config)
+            with patch('shalev.agent_actions.agent_action_multi_input_many_targets') as many:
+                result = runner.invoke(cli, [
+                    'agent', 'stm', '--inputs', 'example_style.tex', '--targets', 'ch1.tex', 'ch2.tex'
+                ])
+            assert result.exit_code == 0, result.output
+            assert many.call_args.args[3] == [('testproj', 'ch1.tex'), ('testproj', 'ch2.tex')]
+
+    def test_agent_positional_pair_is_split(self, test_workspace_path):
+        """Test that source and destination pairs reach the action as (project, component)."""
+        runner = CliRunner()
+        shalev_config = f"workspace_folder: {test_workspace_path}\n"
+        with runner.isolated_filesystem():
+            with open('.shalev.yaml', 'w') as f:
+                f.write(shalev_config)
+            with patch('shalev.agent_actions.agent_action_source_and_dest_components') as action:
+                result = runner.invoke(cli, ['agent', 'st', 'testproj~ch1.tex', 'ch2.tex'])
+                assert result.exit_code == 0, result.output
+                assert action.call_args.args[2:6] == ('testproj', 'ch1.tex', 'testproj', 'ch2.tex')
+                result = runner.invoke(cli, ['agent', 'st', 'ch1.tex', 'ch2.tex'])
+                assert result.output.count('Single project in workspace') == 1
+                result = runner.invoke(cli, ['agent', 'st', 'testproj~a~b.tex'])
+            assert result.exit_code != 0
+            assert "too many '~'" in result.output
+            result = runner.invoke(cli, ['agent', 'st', 'nosuchproj~ch1.tex'])
+            assert result.exit_code == 2
+            assert "Project 'nosuchproj' not found" in result.output
+
+    def test_agent_aliases_resolved(self, test_workspace_path):
+        """Test that aliases in flag mode are resolved and reported."""
+        runner = CliRunner()
+        shalev_config = (f"workspace_folder: {test_workspace_path}\n"
+                         "aliases:\n  ex: testproj~example_style.tex\n  c1: testproj~ch1.tex\n")
+        with runner.isolated_filesystem():
+            with open('.shalev.yaml', 'w') as f:
+                f.write(shalev_config)
+            with patch('shalev.agent_actions.agent_action_multi_input_components') as action:
+                result = runner.invoke(cli, ['agent', 'stm', '--inputs', 'ex', '--target', 'c1'])
+            assert result.exit_code == 0, result.output
+            assert "Using alias 'ex' -> 'testproj~example_style.tex'\nUsing alias 'c1'" in result.output
+            assert action.call_args.args[2:5] == ([('testproj', 'example_style.tex')], 'testproj', 'ch1.tex')
+
+    def test_alias_note_precedes_project_message(self, test_workspace_path):
+        """Test that an alias line is echoed before the default project is reported."""
+        runner = CliRunner()
+        shalev_config = f"workspace_folder: {test_workspace_path}\naliases:\n  c1: ch1.tex\n"
+        with runner.isolated_filesystem():
+            with open('.shalev.yaml', 'w') as f:
+                f.write(shalev_config)
+            with patch('shalev.agent_actions.agent_action_single_component'):
+                result = runner.invoke(cli, ['agent', 'echo', 'c1'])
+            assert result.exit_code == 0, result.output
+            assert result.output.index("Using alias 'c1'") < result.output.index("Single project in workspace")
+
     def test_agent_flag_mode_missing_targets(self, test_workspace_path):
         """Test that flag mode without targets fails."""
         runner = CliRunner()
@@ -112,6 +216,7 @@ class TestStatusCommand:
             assert result.exit_code == 0
             assert 'Test Workspace' in result.output
             assert 'testproj' in result.output
+            assert result.output.rstrip().splitlines()[-1].startswith('    build_folder:')
 
 
 class TestTreeCommand:
@@ -160,3 +265,125 @@ class TestConfigCommand:
         # Verify files were created
         assert (global_dir / 'fix_grammar.yaml').exists()
         assert (global_dir / 'style_transfer.yaml').exists()
+
+    def test_alias_list_sees_saved_alias(self):
+        """Test that a saved alias shows up even after the config was read and cached."""
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            with open('.shalev.yaml', 'w') as f:
+                f.write("workspace_folder: /tmp\n")
+            result = runner.invoke(cli, ['alias', '--list'])
+            assert 'No aliases configured.' in result.output
+            runner.invoke(cli, ['alias', 'ch1', 'testproj~ch1.tex'])
+            result = runner.invoke(cli, ['alias', '--list'])
+            assert 'ch1 -> testproj~ch1.tex' in result.output
+
+    def test_config_parsed_once_per_run(self, test_workspace_path):
+        """Test that setup_workspace, aliases and default project share one parse of .shalev.yaml."""
+        import yaml
+        from shalev import shalev_config
+        from shalev.shalev_eachrun_setup import setup_workspace
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            with open('.shalev.yaml', 'w') as f:
+                f.write(f"workspace_folder: {test_workspace_path}\ndefault_project: testproj\n")
+            with patch('shalev.shalev_config.yaml.load', wraps=yaml.load) as load:
+                setup_workspace()
+                assert shalev_config.get_default_project() == 'testproj'
+                assert dict(shalev_config.get_aliases()) == {}
+            config_loads = [c for c in load.call_args_list if getattr(c.args[0], 'name', '') == os.path.abspath('.shalev.yaml')]
+            assert len(config_loads) == 1
+
+    def test_aliases_are_read_only(self):
+        """Test that the cached aliases can't be modified by a caller."""
+        from shalev.shalev_config import get_aliases
+        runner = CliRunner()
+        with runner.isolated_filesystem():
+            with open('.shalev.yaml', 'w') as f:
+                f.write("aliases:\n  ch1: testproj~ch1.tex\n")
+            aliases = get_aliases()
+            with pytest.raises(TypeError):
+                aliases['ch2'] = 'testproj~ch2.tex'
+            assert dict(get_aliases()) == {'ch1': 'testproj~ch1.tex'}
+
+
+class TestFlushCommand:
+    """Tests for the flush command."""
+
+    def test_summary_then_listing(self, tmp_workspace_data):
+        """Test that flush shows a file count, lists names with --verbose, and keeps files on 'n'."""
+        build_folder = tmp_workspace_data.projects['testproj'].build_folder
+        os.makedirs(build_folder, exist_ok=True)
+        for name in ('b.aux', 'a.log'):
+            with open(os.path.join(build_folder, name), 'w') as f:
+                f.write('x')
+        runner = CliRunner()
+        with patch('shalev.cli.setup_workspace', return_value=tmp_workspace_data), \
+                patch('shalev.cli.find_git_root', return_value=None):
+            result = runner.invoke(cli, ['flush'], input='n\n')
+            assert '2 file(s) in' in result.output
+            assert 'a.log' not in result.output
+            result = runner.invoke(cli, ['flush', '--verbose'], input='n\n')
+            assert result.output.index('a.log') < result.output.index('b.aux')
+        assert 'Aborted.' in result.output
+        assert sorted(os.listdir(build_folder)) == ['a.log', 'b.aux']
+
+    def test_deletes_files_and_subfolders(self, tmp_workspace_data):
+        """Test that confirming empties the build folder but keeps the folder itself."""
+        build_folder = tmp_workspace_data.projects['testproj'].build_folder
+        os.makedirs(os.path.join(build_folder, 'sub'), exist_ok=True)
+        for name in ('root.aux', os.path.join('sub', 'part.log')):
+            with open(os.path.join(build_folder, name), 'w') as f:
+                f.write('x')
+        runner = CliRunner()
+        with patch('shalev.cli.setup_workspace', return_value=tmp_workspace_data), \
+                patch('shalev.cli.find_git_root', return_value=None):
+            result = runner.invoke(cli, ['flush'], input='y\n')
+        assert result.exit_code == 0, result.output
+        assert os.path.isdir(build_folder)
+        assert os.listdir(build_folder) == []
+
+
+class TestSetupCommand:
+    """Tests for the setup command."""
+
+    def test_creates_workspace(self, tmp_path):
+        """Test that setup creates the config and project folders and updates .gitignore."""
+        runner = CliRunner()
+        result = runner.invoke(cli, ['setup', '-p', 'book', '-p', 'notes', str(tmp_path)], input='y\n')
+        assert result.exit_code == 0, result.output
+        for path in ('workspace_config.yaml', 'action_prompts', 'book_project/build', 'notes_project/components/root.tex'):
+            assert os.path.exists(tmp_path / path)
+            assert f"Created {tmp_path / path}" in result.output
+        assert (tmp_path / '.gitignore').read_text() == "book_project/build\nnotes_project/build\n"
+
+    def test_keeps_existing_root(self, tmp_path):
+        """Test that setup doesn't truncate a root.tex that already exists."""
+        components = tmp_path / 'book_project' / 'components'
+        components.mkdir(parents=True)
+        (components / 'root.tex').write_text('existing')
+        runner = CliRunner()
+        result = runner.invoke(cli, ['setup', '-p', 'book', str(tmp_path)], input='n\n')
+        assert result.exit_code == 0, result.output
+        assert (components / 'root.tex').read_text() == 'existing'
+        assert f"Created {components / 'root.tex'}" not in result.output
+
+
+class TestViewCommand:
+    """Tests for the view command."""
+
+    def test_opens_pdf_without_waiting(self, tmp_workspace_data, monkeypatch):
+        """Test that view starts the platform's opener detached instead of waiting on it."""
+        import sys
+        build_folder = tmp_workspace_data.projects['testproj'].build_folder
+        os.makedirs(build_folder, exist_ok=True)
+        pdf_path = os.path.join(build_folder, 'composed_project.pdf')
+        open(pdf_path, 'w').close()
+        monkeypatch.setattr(sys, 'platform', 'linux')
+        runner = CliRunner()
+        with patch('shalev.cli.setup_workspace', return_value=tmp_workspace_data), \
+                patch('shalev.compose_actions.compose.subprocess.Popen') as popen:
+            result = runner.invoke(cli, ['view'])
+        assert result.exit_code == 0, result.output
+        assert popen.call_args.args[0] == ['xdg-open', pdf_path]
+        assert popen.call_args.kwargs['start_new_session']
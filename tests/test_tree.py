@@ -78,3 +78,11 @@ class TestBuildTree:
         children = build_tree(test_project.root_component, test_project.components_folder)
         # ch1, ch2, sec1_1, sec1_2, sec2_1, subsec1_2_1 = 6 nodes
         assert count_nodes(children) == 6
+
+    def test_cycle_gives_empty_subtree(self, tmp_path):
+        """Test that a file including one of its ancestors stops there."""
+        (tmp_path / 'a.tex').write_text("!!!>include(b.tex)\n")
+        (tmp_path / 'b.tex').write_text("!!!>include(a.tex)\n!!!>include(c.tex)\n")
+        (tmp_path / 'c.tex').write_text("leaf\n")
+        children = build_tree(str(tmp_path / 'a.tex'), str(tmp_path))
+        assert children == [('b.tex', [('a.tex', []), ('c.tex', [])])]
@@ -80,3 +80,77 @@ class TestActionPrompts:
         assert configs['stm'][1] == 'global'
         assert configs['ltb'][1] == 'project'
         assert configs['expand'][1] == 'component'
+
+
+class TestWorkspaceConfigCache:
+    """Tests for the cached workspace_config.yaml parse."""
+
+    def test_parse_reused_until_file_changes(self, test_workspace_path, tmp_path):
+        """Test that an unchanged config isn't reparsed, and an edited one is."""
+        import shutil
+        from unittest.mock import patch
+        import yaml
+        from shalev import shalev_eachrun_setup as setup
+        path = tmp_path / 'workspace_config.yaml'
+        shutil.copy(os.path.join(test_workspace_path, 'workspace_config.yaml'), path)
+        with patch.object(setup.yaml, 'load', wraps=yaml.load) as load:
+            first = setup.load_workspace_config(str(path))
+            assert setup.load_workspace_config(str(path)) is first
+            assert load.call_count == 1
+            path.write_text(path.read_text().replace('Test Workspace', 'Renamed Workspace'))
+            assert setup.load_workspace_config(str(path))['workspace']['name'] == 'Renamed Workspace'
+            assert load.call_count == 2
+
+    def test_snapshot_used_by_a_new_process(self, test_workspace_path, tmp_path):
+        """Test that a fresh in-memory cache is filled from the on-disk snapshot."""
+        import shutil
+        from unittest.mock import patch
+        from shalev import shalev_eachrun_setup as setup
+        path = tmp_path / 'workspace_config.yaml'
+        shutil.copy(os.path.join(test_workspace_path, 'workspace_config.yaml'), path)
+        expected = setup.load_workspace_config(str(path))
+        setup._workspace_config_cache.clear()
+        with patch.object(setup.yaml, 'load') as load:
+            assert setup.load_workspace_config(str(path)) == expected
+        load.assert_not_called()
+
+
+class TestGitignoreEntries:
+    """Tests for the .gitignore coverage check."""
+
+    def test_whole_lines_matched(self, tmp_path):
+        """Test that entries match whole lines, with or without surrounding slashes."""
+        from shalev.shalev_eachrun_setup import missing_gitignore_entries
+        gitignore = tmp_path / '.gitignore'
+        gitignore.write_text("# builds\n/a_project/build/\nb_project/build_old\n")
+        entries = ['a_project/build', 'b_project/build']
+        assert missing_gitignore_entries(str(gitignore), entries) == ['b_project/build']
+        assert missing_gitignore_entries(str(tmp_path / 'missing'), entries) == entries
+
+    def test_health_check_appends_missing(self, tmp_workspace_data, tmp_path, monkeypatch, capsys):
+        """Test that accepted build folders are appended to .gitignore after existing lines."""
+        from shalev.shalev_eachrun_setup import check_workspace_health
+        workspace_folder = str(tmp_path / 'test_workspace')
+        gitignore = os.path.join(workspace_folder, '.gitignore')
+        with open(gitignore, 'w') as f:
+            f.write("*.aux\n")
+        monkeypatch.setattr('builtins.input', lambda prompt: 'y')
+        check_workspace_health(tmp_workspace_data, workspace_folder)
+        with open(gitignore) as f:
+            lines = f.read().splitlines()
+        expected = [os.path.relpath(p.build_folder, workspace_folder)
+                    for p in tmp_workspace_data.projects.values()]
+        assert lines == ['*.aux'] + expected
+
+
+class TestFindGitRoot:
+    """Tests for locating the enclosing git repository."""
+
+    def test_nested_folder(self, tmp_path):
+        """Test that the repository root is found from a nested folder, and None outside one."""
+        from shalev.shalev_eachrun_setup import find_git_root
+        build = tmp_path / 'proj' / 'build'
+        build.mkdir(parents=True)
+        assert find_git_root(str(build)) is None
+        (tmp_path / '.git').mkdir()
+        assert find_git_root(str(build)) == str(tmp_path)